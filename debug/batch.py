@@ -0,0 +1,102 @@
+import argparse
+import glob
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from modules.hoister import Hoister
+from modules.lexer import Lexer
+from modules.optimizer import Optimizer
+from modules.parser import Parser
+from modules.resolver import Resolver
+from modules.runner import Runner
+from modules.symbolizer import Symbolizer
+from modules.vm import VM, Assembler
+
+# usage: python -m debug.batch <src.pas> [inputs] [--engine runner|bytecode] [--workers N]
+
+ENGINES = {
+    'runner': (lambda ast: ast, Runner),
+    'bytecode': (lambda ast: Assembler(ast).assemble(), VM),
+}
+
+# set in the parent before the pool starts, forked workers inherit it instead of unpickling it per case
+program = None
+
+
+def compile_(path, engine):
+    with open(path, 'r') as source:
+        ast = Parser(Lexer(source.read()).iter_tokens()).parse()
+    Symbolizer(ast).symbolize()
+    removed = Optimizer(ast).optimize()
+    hoisted = Hoister(ast).optimize()
+    Resolver(ast).resolve()
+    return ENGINES[engine][0](ast), removed, hoisted
+
+
+def run_case(engine, path):
+    runner = ENGINES[engine][1](program)
+    output = io.StringIO()
+    runner.writer.stream = output
+    error = None
+    with open(path, 'rb') as stream:
+        runner.reader.stream = stream
+        try:
+            runner.run()
+        except SystemExit as exit_:
+            error = str(exit_)
+        except Exception as exception:
+            error = '{}: {}'.format(type(exception).__name__, exception)
+    return path, output.getvalue(), error
+
+
+# an input without an expected output is skipped, it does not stop the batch
+def expected(path):
+    try:
+        with open(os.path.splitext(path)[0] + '.out', 'r') as out:
+            return out.read()
+    except FileNotFoundError:
+        return None
+
+
+def main(args):
+    global program
+    start = time.perf_counter()
+    program, removed, hoisted = compile_(args.src, args.engine)
+    compiled = time.perf_counter() - start
+    inputs = args.inputs if args.inputs is not None else os.path.dirname(os.path.abspath(args.src))
+    cases = sorted(glob.glob(os.path.join(inputs, '*.in')) if os.path.isdir(inputs) else glob.glob(inputs))
+    failed = 0
+    skipped = 0
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(args.workers, mp_context=context) as executor:
+        for path, output, error in executor.map(run_case, [args.engine] * len(cases), cases):
+            out = expected(path)
+            if out is None:
+                skipped += 1
+                print('{}\tSKIPPED\tno {}'.format(path, os.path.basename(os.path.splitext(path)[0] + '.out')))
+                continue
+            if error is None and output.rstrip('\n') == out.rstrip('\n'):
+                print('{}\tOK'.format(path))
+                continue
+            failed += 1
+            print('{}\tERROR'.format(path))
+            if error is not None:
+                print(error)
+    elapsed = time.perf_counter() - start
+    print('{} of {} passed, {} skipped, compiled in {:.3f}s ({} nodes removed, {} expressions hoisted), '
+          '{:.3f}s total, {:.1f} cases/s'.format(len(cases) - failed - skipped, len(cases), skipped, compiled, removed,
+                                                 hoisted, elapsed, len(cases) / elapsed))
+    return failed
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('src')
+    arg_parser.add_argument('inputs', nargs='?')
+    arg_parser.add_argument('--engine', choices=list(ENGINES), default='runner')
+    arg_parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = arg_parser.parse_args()
+    raise SystemExit(1 if main(args) > 0 else 0)
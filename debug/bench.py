@@ -0,0 +1,542 @@
+import argparse
+import contextlib
+import gc
+import glob
+import io
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from modules.cache import Cache
+from modules.compiler import Compiler
+from modules.generator import Generator
+from modules.grapher import Visitor
+from modules.hoister import Hoister
+from modules.lexer import Lexer
+from modules.limits import recursion_limit
+from modules.optimizer import Optimizer
+from modules.parser import BinOp, Id, Int, Node, Parser
+from modules.pygenerator import PyGenerator
+from modules.reader import Reader
+from modules.resolver import Resolver
+from modules.runner import Runner
+from modules.symbolizer import Symbolizer
+from modules.trampoline import Trampoline
+from modules.vectorizer import Vectorizer
+from modules.vm import VM, Assembler
+from modules.writer import POLICIES
+
+# usage: python -m debug.bench <benchmark> [--size N] [--repeat N]
+
+
+def synthetic_program(statements):
+    lines = ['var', '\tniz : array[1..100] of integer;', '\ti, j, n, temp : integer;', '\tx : real;', '', 'begin']
+    for k in range(statements // 4):
+        lines.append('\tfor i := 1 to n do')
+        lines.append('\tbegin')
+        lines.append("\t\tif niz[i] <= niz[j] then begin temp := niz[i] * {} + (j div 2); end;".format(k))
+        lines.append("\t\twrite(niz[i], ' ', 'done', x);")
+        lines.append('\tend;')
+    lines.append('end.')
+    return '\n'.join(lines)
+
+
+def measure(fun, repeat):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        start = time.perf_counter()
+        fun()
+        elapsed = time.perf_counter() - start
+        gc.enable()
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def debug_sources():
+    root = os.path.dirname(os.path.abspath(__file__))
+    return sorted(glob.glob(os.path.join(root, '[0-9][0-9]', 'src.pas')))
+
+
+def token_stream(text, backend):
+    return [(t.class_, t.lexeme) for t in Lexer(text, backend).lex()]
+
+
+def bench_lex(args):
+    backends = ['char', 'table', 'regex']
+    for path in debug_sources():
+        with open(path, 'r') as source:
+            text = source.read()
+        expected = token_stream(text, 'char')
+        for backend in backends[1:]:
+            if token_stream(text, backend) != expected:
+                raise SystemExit("Token stream mismatch: {} {}".format(backend, path))
+    text = synthetic_program(args.size)
+    print('source: {} statements, {:.1f} MB'.format(args.size, len(text) / 1e6))
+    expected = token_stream(text, 'char')
+    for backend in backends:
+        if token_stream(text, backend) != expected:
+            raise SystemExit("Token stream mismatch: {}".format(backend))
+        elapsed = measure(lambda: Lexer(text, backend).lex(), args.repeat)
+        print('{:>8}: {:.3f}s {:>12.0f} tokens/s'.format(backend, elapsed, len(expected) / elapsed))
+
+
+def peak_memory(fun):
+    tracemalloc.start()
+    fun()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def bench_stream(args):
+    for size in [args.size // 100, args.size // 10, args.size]:
+        text = synthetic_program(size)
+        eager = peak_memory(lambda: Parser(Lexer(text).lex()).parse())
+        lazy = peak_memory(lambda: Parser(Lexer(text).iter_tokens()).parse())
+        print('{:>8} statements: lex() {:8.1f} MB, iter_tokens() {:8.1f} MB'.format(size, eager / 1e6, lazy / 1e6))
+    text = synthetic_program(args.size).replace('begin', 'begin begin', 1)
+    for name, tokens in [('lex()', lambda: Lexer(text).lex()), ('iter_tokens()', lambda: Lexer(text).iter_tokens())]:
+        start = time.perf_counter()
+        try:
+            Parser(tokens()).parse()
+        except SystemExit as error:
+            print('{:>14}: "{}" after {:.3f}s'.format(name, error, time.perf_counter() - start))
+
+
+def bench_parse(args):
+    size = 1000
+    while size <= args.size:
+        text = synthetic_program(size // 12)
+        tokens = Lexer(text).lex()
+        elapsed = measure(lambda: Parser(list(tokens)).parse(), args.repeat)
+        print('{:>9} tokens: {:8.3f}s {:6.2f} us/token'.format(len(tokens), elapsed, elapsed / len(tokens) * 1e6))
+        size *= 10
+
+
+def nested_calls(depth):
+    expr = '1'
+    for i in range(depth):
+        expr = 'f({}, x + {})'.format(expr, i)
+    return 'function f(a, b: integer): integer; begin exit(a + b); end; ' \
+           'var x: integer; begin x := {}; writeln(x); end.'.format(expr)
+
+
+def bench_memo(args):
+    for depth in [4, 8, 12, 16]:
+        tokens = Lexer(nested_calls(depth)).lex()
+        for memo in [False, True]:
+            parser = Parser(list(tokens), memo)
+            start = time.perf_counter()
+            parser.parse()
+            elapsed = time.perf_counter() - start
+            print('depth {:>2}, memo {:>5}: {:8.4f}s hits {:>4} misses {:>4}'.format(
+                depth, str(memo), elapsed, parser.memo_hits, parser.memo_misses))
+
+
+def numeric_program(iterations):
+    return """
+        var
+            a : array[1..100] of integer;
+            i, j, s : integer;
+        begin
+            s := 0;
+            for i := 1 to {} do
+            begin
+                for j := 1 to 100 do
+                begin
+                    a[j] := i * j mod 7;
+                    s := s + a[j] - 1;
+                end;
+            end;
+            writeln(s);
+        end.
+    """.format(iterations)
+
+
+def symbolized(text):
+    ast = Parser(Lexer(text).iter_tokens()).parse()
+    Symbolizer(ast).symbolize()
+    Optimizer(ast).optimize()
+    Hoister(ast).optimize()
+    Resolver(ast).resolve()
+    return ast
+
+
+ENGINES = {
+    'runner': lambda ast: Runner(ast).run(),
+    'trampoline': lambda ast: Trampoline(ast).run(),
+    'closures': lambda ast: Compiler(ast).run(),
+    'python': lambda ast: PyGenerator(ast).run(),
+    'bytecode': lambda ast: VM(Assembler(ast).assemble()).run(),
+}
+
+
+def bench_run(args):
+    text = numeric_program(args.size // 100)
+    print('program: {} inner loop iterations'.format(args.size))
+    for name, engine in ENGINES.items():
+        ast = symbolized(text)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            elapsed = measure(lambda: engine(ast), args.repeat)
+        print('{:>10}: {:.3f}s {:>12.0f} iterations/s'.format(name, elapsed, args.size / elapsed))
+
+
+FIB = """
+    function fib(n: integer): integer;
+    begin
+        if n < 2 then
+        begin
+            exit(n);
+        end;
+        exit(fib(n - 1) + fib(n - 2));
+    end;
+
+    begin
+        writeln(fib({}));
+    end.
+"""
+
+ACKERMANN = """
+    function ack(m, n: integer): integer;
+    begin
+        if m = 0 then
+        begin
+            exit(n + 1);
+        end;
+        if n = 0 then
+        begin
+            exit(ack(m - 1, 1));
+        end;
+        exit(ack(m - 1, ack(m, n - 1)));
+    end;
+
+    begin
+        writeln(ack(2, {}));
+    end.
+"""
+
+
+def bench_calls(args):
+    # the closure and python engines recurse on the python stack as well, the limit is back once the bench is over
+    with recursion_limit(100000):
+        for name, text in [('fib(25)', FIB.format(25)), ('ack(2, 200)', ACKERMANN.format(200))]:
+            for engine, run in ENGINES.items():
+                ast = symbolized(text)
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                    elapsed = measure(lambda: run(ast), args.repeat)
+                print('{:>12} {:>10}: {:.3f}s'.format(name, engine, elapsed))
+
+
+DEEP = """
+    function down(n: integer): integer;
+    begin
+        if n = 0 then
+        begin
+            exit(0);
+        end;
+        exit(down(n - 1) + 1);
+    end;
+
+    function count(n, acc: integer): integer;
+    begin
+        if n = 0 then
+        begin
+            exit(acc);
+        end;
+        exit(count(n - 1, acc + 1));
+    end;
+
+    begin
+        writeln({});
+    end.
+"""
+
+
+def bench_deep(args):
+    for call in ['down({})'.format(args.size), 'count({}, 0)'.format(args.size)]:
+        ast = symbolized(DEEP.format(call))
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            elapsed = measure(lambda: Trampoline(ast).run(), args.repeat)
+        print('{:>16}: {:.3f}s'.format(call, elapsed))
+
+
+class Walker(Visitor):
+    def visit_BinOp(self, parent, node):
+        self.visit(node, node.first)
+        self.visit(node, node.second)
+
+    def visit_Int(self, parent, node):
+        pass
+
+    def visit_Id(self, parent, node):
+        pass
+
+
+class NamedWalker(Walker):
+    # the name based dispatch every visitor used before the dispatch table
+    def visit(self, parent, node):
+        method = 'visit_' + type(node).__name__
+        visitor = getattr(self, method, self.die)
+        return visitor(parent, node)
+
+
+def expression_tree(leaves):
+    if leaves == 1:
+        return Id('x')
+    if leaves == 2:
+        return BinOp('*', Id('x'), Int(2))
+    half = leaves // 2
+    return BinOp('+', expression_tree(half), expression_tree(leaves - half))
+
+
+def bench_visit(args):
+    tree = expression_tree(args.size)
+    visits = 2 * args.size - 1
+    for name, walker in [('getattr', NamedWalker), ('dispatch', Walker)]:
+        elapsed = measure(lambda: walker().visit(None, tree), args.repeat)
+        print('{:>10}: {:.3f}s {:>12.0f} visits/s'.format(name, elapsed, visits / elapsed))
+
+
+def fields(node):
+    values = list(getattr(node, '__dict__', {}).values())
+    for type_ in type(node).__mro__:
+        values.extend(getattr(node, name) for name in getattr(type_, '__slots__', ()) if hasattr(node, name))
+    return values
+
+
+def count_nodes(ast):
+    count = 0
+    stack = [ast]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, list):
+            stack.extend(value)
+        elif isinstance(value, Node):
+            count += 1
+            stack.extend(fields(value))
+    return count
+
+
+def bench_memory(args):
+    text = synthetic_program(args.size)
+    tracemalloc.start()
+    tokens = Lexer(text).lex()
+    token_memory = tracemalloc.get_traced_memory()[0]
+    ast = Parser(tokens).parse()
+    Symbolizer(ast).symbolize()
+    del tokens
+    ast_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print('{} tokens: {:.1f} MB'.format(len(Lexer(text).lex()), token_memory / 1e6))
+    print('{} nodes: {:.1f} MB'.format(count_nodes(ast), ast_memory / 1e6))
+
+
+def bench_arrays(args):
+    for type_ in ['integer', 'real', 'char', 'boolean']:
+        text = 'var a : array[1..{}] of {}; begin end.'.format(args.size, type_)
+        ast = symbolized(text)
+        runner = Runner(ast)
+        peak = peak_memory(runner.run)
+        print('{:>8}: {} elements {:8.1f} MB'.format(type_, args.size, peak / 1e6))
+
+
+KERNEL = """
+    var
+        a, b : array[1..{0}] of integer;
+        i, s : integer;
+    begin
+        for i := 1 to {0} do
+        begin
+            a[i] := i * 3 mod 7;
+        end;
+        for i := 1 to {0} do
+        begin
+            b[i] := a[i];
+        end;
+        s := 0;
+        for i := 1 to {0} do
+        begin
+            s := s + b[i] * 2;
+        end;
+        for i := 1 to {0} do
+        begin
+            a[i] := 0;
+        end;
+        writeln(s);
+    end.
+"""
+
+
+def bench_vector(args):
+    text = KERNEL.format(args.size)
+    print('kernel: map, copy, sum and fill over {} elements'.format(args.size))
+    for name, runner in [('runner', Runner), ('numpy', Vectorizer)]:
+        ast = symbolized(text)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            elapsed = measure(lambda: runner(ast).run(), args.repeat)
+        print('{:>8}: {:.3f}s {:>14.0f} elements/s'.format(name, elapsed, 4 * args.size / elapsed))
+
+
+def bench_fold(args):
+    for path in debug_sources():
+        with open(path, 'r') as source:
+            ast = Parser(Lexer(source.read()).lex()).parse()
+        Symbolizer(ast).symbolize()
+        optimizer = Optimizer(ast)
+        total = optimizer.count(ast)
+        removed = optimizer.optimize()
+        print('{}: removed {:>3} of {:>4} nodes'.format(os.path.basename(os.path.dirname(path)), removed, total))
+
+
+INVARIANT = """
+    var
+        i, j, n, m, s : integer;
+    begin
+        n := {};
+        m := 7;
+        s := 0;
+        for i := 1 to n div 100 do
+        begin
+            for j := 1 to m * 10 + 30 do
+            begin
+                s := s + (m * m + 3) * (n - m) + j;
+            end;
+        end;
+        writeln(s);
+    end.
+"""
+
+
+def bench_hoist(args):
+    text = INVARIANT.format(args.size)
+    for hoist in [False, True]:
+        ast = Parser(Lexer(text).lex()).parse()
+        Symbolizer(ast).symbolize()
+        hoisted = Hoister(ast).optimize() if hoist else 0
+        Resolver(ast).resolve()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            elapsed = measure(lambda: Runner(ast).run(), args.repeat)
+        print('hoist {:>5}: {:.3f}s {:>2} expressions hoisted'.format(str(hoist), elapsed, hoisted))
+
+
+def bench_cache(args):
+    text = synthetic_program(args.size // 10)
+    directory = tempfile.mkdtemp()
+    try:
+        for kind, build in [('ast', symbolized), ('bytecode', lambda text: Assembler(symbolized(text)).assemble())]:
+            cache = Cache(directory)
+            cold = measure(lambda: build(text), args.repeat)
+            cache.store(text, build(text), kind)
+            warm = measure(lambda: cache.load(text, kind), args.repeat)
+            size = os.path.getsize(cache.path(text, kind))
+            print('{:>8}: cold {:.3f}s warm {:.3f}s entry {:.1f} MB'.format(kind, cold, warm, size / 1e6))
+    finally:
+        shutil.rmtree(directory)
+
+
+SUM = """
+    var
+        i, n, x, s : integer;
+    begin
+        read(n);
+        s := 0;
+        for i := 1 to n do
+        begin
+            read(x);
+            s := s + x;
+        end;
+        writeln(s);
+    end.
+"""
+
+
+def bench_read(args):
+    data = '{}\n{}\n'.format(args.size, '\n'.join(' '.join(str(j) for j in range(i, i + 10))
+                                                 for i in range(0, args.size, 10))).encode()
+    reader = Reader(io.BytesIO(data))
+    elapsed = measure(lambda: [reader.read('integer') for _ in range(args.size + 1)], 1)
+    print('{:>10}: {:.3f}s {:>12.0f} integers/s'.format('reader', elapsed, args.size / elapsed))
+    for name, engine in [('runner', Runner), ('bytecode', lambda ast: VM(Assembler(ast).assemble()))]:
+        def run():
+            runner = engine(symbolized(SUM))
+            runner.reader = Reader(io.BytesIO(data))
+            runner.run()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            elapsed = measure(run, args.repeat)
+        print('{:>10}: {:.3f}s {:>12.0f} integers/s'.format(name, elapsed, args.size / elapsed))
+
+
+COUNT = """
+    var
+        i, n : integer;
+    begin
+        n := {};
+        for i := 1 to n do
+        begin
+            writeln(i);
+        end;
+    end.
+"""
+
+
+def bench_write(args):
+    text = COUNT.format(args.size)
+    for name, engine in [('runner', Runner), ('bytecode', lambda ast: VM(Assembler(ast).assemble()))]:
+        for policy in POLICIES:
+            def run():
+                runner = engine(symbolized(text))
+                runner.writer.policy = policy
+                runner.run()
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                elapsed = measure(run, args.repeat)
+            print('{:>10} {:>5}: {:.3f}s {:>12.0f} lines/s'.format(name, policy, elapsed, args.size / elapsed))
+
+
+def bench_generate(args):
+    ast = symbolized(synthetic_program(args.size))
+    lines = Generator(ast).source().count('\n')
+    elapsed = measure(lambda: Generator(ast).source(), args.repeat)
+    peak = peak_memory(lambda: Generator(ast).source())
+    print('  source: {:.3f}s {:>10.0f} lines/s {:6.1f} MB peak'.format(elapsed, lines / elapsed, peak / 1e6))
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'gen.c')
+        elapsed = measure(lambda: Generator(ast).generate(path), args.repeat)
+        peak = peak_memory(lambda: Generator(ast).generate(path))
+        print('generate: {:.3f}s {:>10.0f} lines/s {:6.1f} MB peak'.format(elapsed, lines / elapsed, peak / 1e6))
+    finally:
+        shutil.rmtree(directory)
+
+
+BENCHMARKS = {
+    'lex': bench_lex,
+    'stream': bench_stream,
+    'parse': bench_parse,
+    'memo': bench_memo,
+    'run': bench_run,
+    'calls': bench_calls,
+    'deep': bench_deep,
+    'visit': bench_visit,
+    'memory': bench_memory,
+    'arrays': bench_arrays,
+    'vector': bench_vector,
+    'fold': bench_fold,
+    'hoist': bench_hoist,
+    'cache': bench_cache,
+    'read': bench_read,
+    'write': bench_write,
+    'generate': bench_generate,
+}
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('benchmark', choices=list(BENCHMARKS))
+    arg_parser.add_argument('--size', type=int, default=100000)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
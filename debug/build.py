@@ -0,0 +1,76 @@
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from modules.generator import Generator
+from modules.hoister import Hoister
+from modules.lexer import Lexer
+from modules.optimizer import Optimizer
+from modules.parser import Parser
+from modules.resolver import Resolver
+from modules.symbolizer import Symbolizer
+
+# usage: python -m debug.build <sources or globs>... [--name gen.c] [--workers N]
+
+
+def compile_(path):
+    start = time.perf_counter()
+    try:
+        with open(path, 'r') as source:
+            ast = Parser(Lexer(source.read()).iter_tokens()).parse()
+        Symbolizer(ast).symbolize()
+        removed = Optimizer(ast).optimize()
+        hoisted = Hoister(ast).optimize()
+        Resolver(ast).resolve()
+        text, error = Generator(ast).source(), None
+    # die() raises SystemExit, in a worker it would take the whole pool down with it
+    except SystemExit as exit_:
+        text, error, removed, hoisted = None, str(exit_), 0, 0
+    except Exception as exception:
+        text, error, removed, hoisted = None, '{}: {}'.format(type(exception).__name__, exception), 0, 0
+    return path, text, error, time.perf_counter() - start, removed, hoisted
+
+
+def target(path, name):
+    if name is not None:
+        return os.path.join(os.path.dirname(path), name)
+    return os.path.splitext(path)[0] + '.c'
+
+
+def sources(patterns):
+    paths = []
+    for pattern in patterns:
+        paths.extend(sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern])
+    return paths
+
+
+def main(args):
+    paths = sources(args.sources)
+    failed = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(args.workers) as executor:
+        futures = [executor.submit(compile_, path) for path in paths]
+        for future in as_completed(futures):
+            path, text, error, elapsed, removed, hoisted = future.result()
+            if error is not None:
+                failed += 1
+                print('{}\tERROR\t{}'.format(path, error))
+                continue
+            with open(target(path, args.name), 'w') as output:
+                output.write(text)
+            print('{}\tOK\t{:.3f}s\t{} nodes removed, {} expressions hoisted'.format(path, elapsed, removed, hoisted))
+    elapsed = time.perf_counter() - start
+    print('{} of {} compiled, {:.3f}s, {:.1f} files/s'.format(
+        len(paths) - failed, len(paths), elapsed, len(paths) / elapsed if elapsed > 0 else 0))
+    return failed
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('sources', nargs='+')
+    arg_parser.add_argument('--name')
+    arg_parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = arg_parser.parse_args()
+    raise SystemExit(1 if main(args) > 0 else 0)
@@ -0,0 +1,445 @@
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from modules.compiler import Compiler
+from modules.generator import Generator
+from modules.hoister import Hoister
+from modules.lexer import Lexer
+from modules.optimizer import Optimizer
+from modules.parser import Parser
+from modules.pygenerator import PyGenerator
+from modules.resolver import Resolver
+from modules.runner import Runner
+from modules.symbolizer import Symbolizer
+from modules.trampoline import Trampoline
+from modules.vectorizer import Vectorizer
+from modules.vm import VM, Assembler
+
+# usage: python -m debug.check [checks]...
+
+# unterminated strings and chars at the end of the text, every backend has to agree on them
+MALFORMED = ["'abc", "x := 'ab", "'", "'a", "x'", "''", "'''", "writeln('a)", "x := 3.", "x := 3.5.", "a @ b", "a\n'"]
+
+
+def tokens(text, backend):
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return [(t.class_, t.lexeme) for t in Lexer(text, backend).lex()]
+    except SystemExit as exit_:
+        return str(exit_)
+    # anything else is a crash, it compares unequal to every other result
+    except Exception as exception:
+        return exception
+
+
+def check_lex():
+    failed = 0
+    for text in MALFORMED:
+        expected = tokens(text, 'char')
+        for backend in ['table', 'regex']:
+            actual = tokens(text, backend)
+            if actual != expected:
+                failed += 1
+                print('lex {!r} {}\tERROR\n{}\n{}'.format(text, backend, actual, expected))
+    return failed
+
+
+ENGINES = {
+    'runner': Runner,
+    'trampoline': Trampoline,
+    'numpy': Vectorizer,
+    'closures': Compiler,
+    'python': PyGenerator,
+    'bytecode': lambda ast: VM(Assembler(ast).assemble()),
+}
+
+
+def compile_(text, optimize=True):
+    ast = Parser(Lexer(text).iter_tokens()).parse()
+    Symbolizer(ast).symbolize()
+    if optimize:
+        Optimizer(ast).optimize()
+    Hoister(ast).optimize()
+    Resolver(ast).resolve()
+    return ast
+
+
+# the output of a run, followed by the error it stopped with
+def execute(engine, text, data='', optimize=True):
+    runner = ENGINES[engine](compile_(text, optimize))
+    output = io.StringIO()
+    runner.writer.stream = output
+    runner.reader.stream = io.BytesIO(data.encode())
+    try:
+        runner.run()
+    except SystemExit as exit_:
+        output.write(str(exit_))
+    except Exception as exception:
+        return exception
+    return output.getvalue()
+
+
+# the generated c is built once per program and run once per input
+def execute_c(text, runs, optimize=True):
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'gen')
+        Generator(compile_(text, optimize)).generate(path + '.c')
+        subprocess.run(['gcc', '-w', '-o', path, path + '.c', '-lm'], check=True, capture_output=True)
+        return [subprocess.run([path], input=data, capture_output=True, text=True).stdout for data, _ in runs]
+    except (SystemExit, Exception) as exception:
+        return [exception] * len(runs)
+    finally:
+        shutil.rmtree(directory)
+
+
+DIVISION = """
+    var
+        a, b, c : integer;
+    begin
+        read(a, b);
+        writeln(a div b);
+        writeln(a mod b);
+        c := -7 div 2;
+        writeln(c);
+        c := -7 mod 2;
+        writeln(c);
+        c := 7 div -2;
+        writeln(c);
+        c := 7 mod -2;
+        writeln(c);
+    end.
+"""
+
+# x is only assigned when the loops run, and b is zero when they do not, nothing may be hoisted above them
+ZERO_TRIP = """
+    var
+        n, i, s, x, a, b : integer;
+    begin
+        read(n, a, b);
+        s := 0;
+        if n > 0 then
+        begin
+            x := 5;
+        end;
+        for i := 1 to n do
+        begin
+            s := s + x * 2 + a div b;
+        end;
+        i := 0;
+        while i < n do
+        begin
+            s := s + x * 3;
+            i := i + 1;
+        end;
+        writeln(s);
+    end.
+"""
+
+# the bound is evaluated once, even when the pass cannot tell its type
+BOUND = """
+    var
+        c : char;
+        i, s : integer;
+    begin
+        read(s);
+        c := 'j';
+        for i := 1 to ord(c) - 100 do
+        begin
+            c := 'a';
+            s := s + 1;
+        end;
+        writeln(s);
+    end.
+"""
+
+# the bound is evaluated after the start, it may not move ahead of a call that changes it
+START = """
+    function f(n: integer): integer;
+    begin
+        g := 5;
+        exit(n);
+    end;
+
+    var
+        i, s, g : integer;
+    begin
+        read(s);
+        g := 0;
+        for i := f(1) to g + 2 do
+        begin
+            s := s + 1;
+        end;
+        writeln(s);
+    end.
+"""
+
+# input is parsed by the declared type of the target, not by how it looks
+TYPED = """
+    procedure p(n: integer);
+    var
+        y : real;
+    begin
+        read(y);
+        writeln(y + n);
+    end;
+
+    var
+        x : real;
+        i : integer;
+        a : array[1..2] of real;
+    begin
+        read(x, i, a[1]);
+        writeln(x);
+        writeln(i);
+        writeln(a[1]);
+        p(i);
+    end.
+"""
+
+# program, then (input, expected output) pairs, every engine and the generated c have to agree
+CASES = [
+    ('division', DIVISION, [('-7 2', '-3\n-1\n-3\n-1\n-3\n1\n'), ('7 -2', '-3\n1\n-3\n-1\n-3\n1\n'),
+                            ('-7 -2', '3\n-1\n-3\n-1\n-3\n1\n'), ('-6 3', '-2\n0\n-3\n-1\n-3\n1\n')]),
+    ('zero trip', ZERO_TRIP, [('0 1 0', '0\n'), ('2 6 3', '54\n')]),
+    ('for bound', BOUND, [('0', '6\n'), ('4', '10\n')]),
+    ('for start', START, [('0', '7\n')]),
+    ('typed read', TYPED, [('5 7 3 2', '5.0\n7\n3.0\n9.0\n')]),
+]
+
+# the generated c declares the globals inside main, routines cannot reach them, and prints reals with six decimals
+NO_C = ['for start', 'typed read']
+
+
+def check_engines():
+    failed = 0
+    for name, text, runs in CASES:
+        results = {engine: [execute(engine, text, data) for data, _ in runs] for engine in ENGINES}
+        if shutil.which('gcc') is not None and name not in NO_C:
+            results['c'] = execute_c(text, runs)
+        for engine, outputs in results.items():
+            for (data, expected), actual in zip(runs, outputs):
+                if actual != expected:
+                    failed += 1
+                    print('{} {} {!r}\tERROR\n{!r}\n{!r}'.format(name, engine, data, actual, expected))
+    return failed
+
+
+FOLD = """
+    var
+        x, y : integer;
+        r : real;
+    begin
+        read(x);
+        y := 0;
+        r := 0.0;
+        {} := {};
+        writeln(y);
+        writeln(r);
+    end.
+"""
+
+# a folded constant has to mean what the expression meant, in the interpreter and in the generated c
+FOLDS = [('r', '7 / 2'), ('r', '7.0 / 2'), ('r', '1 / 4 + 0.5'), ('r', '2.5 * 2 - 1'), ('y', '-7 div 2 + 7 mod -2'),
+         ('y', '(x + 0) * 1 + 2 * 3'), ('y', '1 * x div 1 - 0')]
+
+
+def check_fold():
+    failed = 0
+    for target, expr in FOLDS:
+        text = FOLD.format(target, expr)
+        results = [('runner', execute('runner', text, '5'), execute('runner', text, '5', False))]
+        if shutil.which('gcc') is not None:
+            results.append(('c', execute_c(text, [('5', None)])[0], execute_c(text, [('5', None)], False)[0]))
+        for engine, actual, expected in results:
+            if actual != expected:
+                failed += 1
+                print('fold {} {}\tERROR\n{!r}\n{!r}'.format(expr, engine, actual, expected))
+    return failed
+
+
+REAL_SUM = """
+    var
+        x : array[1..1000] of real;
+        i : integer;
+        s : real;
+    begin
+        for i := 1 to 1000 do
+        begin
+            x[i] := 0.1;
+        end;
+        s := 0.0;
+        for i := 1 to 1000 do
+        begin
+            s := s + x[i];
+        end;
+        writeln(s);
+    end.
+"""
+
+OVERFLOW = """
+    var
+        a, b : array[1..100] of integer;
+        i, s : integer;
+    begin
+        for i := 1 to 100 do
+        begin
+            a[i] := 1099511627776;
+        end;
+        for i := 1 to 100 do
+        begin
+            b[i] := a[i] * a[i] div a[i];
+        end;
+        s := 0;
+        for i := 1 to 100 do
+        begin
+            s := s + a[i] * 4194304;
+        end;
+        writeln(b[1]);
+        writeln(s);
+    end.
+"""
+
+ZERO = """
+    var
+        a, b : array[1..10] of integer;
+        x : array[1..10] of real;
+        i : integer;
+    begin
+        for i := 1 to 10 do
+        begin
+            b[i] := i - 5;
+        end;
+        for i := 1 to 10 do
+        begin
+            {}
+        end;
+        writeln(a[1]);
+    end.
+"""
+
+# the numpy runner has to print what the scalar loop prints, or stop with the same error
+VECTOR = [
+    ('real sum', REAL_SUM),
+    ('int64 overflow', OVERFLOW),
+    ('zero div', ZERO.format('a[i] := 100 div b[i];')),
+    ('zero mod', ZERO.format('a[i] := 100 mod b[i];')),
+    ('zero /', ZERO.format('x[i] := 1.0 / b[i];')),
+    ('nonzero', ZERO.format('a[i] := 100 div (b[i] * b[i] + 1);')),
+]
+
+
+def check_vector():
+    failed = 0
+    for name, text in VECTOR:
+        expected, actual = execute('runner', text), execute('numpy', text)
+        if repr(actual) != repr(expected):
+            failed += 1
+            print('vector {}\tERROR\n{!r}\n{!r}'.format(name, actual, expected))
+    return failed
+
+
+DOWN = """
+    function down(n: integer): integer;
+    begin
+        if n = 0 then
+        begin
+            exit(0);
+        end;
+        exit(down(n - 1) + 1);
+    end;
+
+    begin
+        writeln(down({}));
+    end.
+"""
+
+# engines that stop at max_depth calls with a clean error instead of a RecursionError, the python one within a few
+DEPTH = ['runner', 'numpy', 'closures', 'python', 'bytecode']
+
+
+def check_depth():
+    failed = 0
+    for engine in DEPTH:
+        limit = sys.getrecursionlimit()
+        for depth, expected in [(9999, '9999\n'), (10010, 'Stack overflow: call depth exceeds 10000')]:
+            actual = execute(engine, DOWN.format(depth))
+            if actual != expected or sys.getrecursionlimit() != limit:
+                failed += 1
+                print('depth {} {}\tERROR\n{!r}\nrecursion limit {} -> {}'.format(
+                    depth, engine, actual, limit, sys.getrecursionlimit()))
+    return failed
+
+
+BOUNDS = """
+    procedure p(i: integer);
+    var
+        b : array[1..5] of integer;
+    begin
+        {}
+    end;
+
+    var
+        a : array[1..5] of integer;
+        i : integer;
+    begin
+        read(i);
+        {}
+        p(i);
+    end.
+"""
+
+# an index outside the declared range stops with the error the runner gives, below the start it must not wrap around
+ACCESSES = ['writeln(a[i]);', 'a[i] := 7;', 'writeln(b[i]);', 'b[i] := 7;']
+INDEXES = ['3', '0', '-1', '6']
+BOUNDED = ['trampoline', 'numpy', 'bytecode']
+
+
+def check_bounds():
+    failed = 0
+    for access in ACCESSES:
+        local = access if 'b[' in access else 'writeln(0);'
+        text = BOUNDS.format(local, 'writeln(0);' if 'b[' in access else access)
+        for data in INDEXES:
+            expected = execute('runner', text, data)
+            for engine in BOUNDED:
+                actual = execute(engine, text, data)
+                if actual != expected:
+                    failed += 1
+                    print('bounds {} {} {!r}\tERROR\n{!r}\n{!r}'.format(access, engine, data, actual, expected))
+    return failed
+
+
+CHECKS = {
+    'lex': check_lex,
+    'depth': check_depth,
+    'engines': check_engines,
+    'fold': check_fold,
+    'vector': check_vector,
+    'bounds': check_bounds,
+}
+
+
+def main(args):
+    failed = 0
+    for name in args.checks or list(CHECKS):
+        failures = CHECKS[name]()
+        print('{}\t{}'.format(name, 'OK' if failures == 0 else '{} ERROR'.format(failures)))
+        failed += failures
+    return failed
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('checks', nargs='*', metavar='check')
+    args = arg_parser.parse_args()
+    for name in args.checks:
+        if name not in CHECKS:
+            arg_parser.error('unknown check: {} (choose from {})'.format(name, ', '.join(CHECKS)))
+    raise SystemExit(1 if main(args) > 0 else 0)
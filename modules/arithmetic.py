@@ -0,0 +1,9 @@
+# div and mod truncate toward zero as in pascal and the generated c, python // and % round toward minus infinity
+# there is no branch on the operands, the same helpers work on numpy arrays
+def pascal_div(first, second):
+    quotient = first // second
+    return quotient + ((quotient < 0) & (quotient * second != first))
+
+
+def pascal_mod(first, second):
+    return first - second * pascal_div(first, second)
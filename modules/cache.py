@@ -0,0 +1,91 @@
+import hashlib
+import os
+import pickle
+
+MODULES = os.path.dirname(os.path.abspath(__file__))
+
+# the compiler version is the content of its sources, any edit invalidates every entry
+SOURCES = [os.path.join(MODULES, name) for name in sorted(os.listdir(MODULES)) if name.endswith('.py')]
+
+
+def version(sources):
+    digest = hashlib.sha256()
+    for path in sources:
+        with open(path, 'rb') as source:
+            digest.update(source.read())
+    return digest.hexdigest()
+
+
+class Cache:
+    def __init__(self, directory='.cache', limit=64 * 1024 * 1024, sources=SOURCES):
+        self.directory = directory
+        self.limit = limit
+        self.version = version(sources)
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, text, kind):
+        key = hashlib.sha256('{}\0{}\0{}'.format(self.version, kind, text).encode()).hexdigest()
+        return os.path.join(self.directory, '{}.pickle'.format(key))
+
+    # a hit touches the entry, eviction goes by modification time, an entry that does not load is a miss and goes
+    def load(self, text, kind='ast'):
+        path = self.path(text, kind)
+        try:
+            with open(path, 'rb') as entry:
+                value = pickle.load(entry)
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception:
+            self.misses += 1
+            self.discard(path)
+            return None
+        self.hits += 1
+        return value
+
+    def store(self, text, value, kind='ast'):
+        path = self.path(text, kind)
+        temp = '{}.{}'.format(path, os.getpid())
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temp, 'wb') as entry:
+                pickle.dump(value, entry, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp, path)
+        except Exception:
+            self.discard(temp)
+            return False
+        self.evict()
+        return True
+
+    def discard(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.pickle'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.limit:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
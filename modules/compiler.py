@@ -0,0 +1,465 @@
+from modules.arithmetic import pascal_div, pascal_mod
+from modules.grapher import Visitor
+from modules.limits import recursion_limit
+from modules.parser import ArrayDecl, ArrayElem, Char, Func, FuncProcCall, Proc, String, ShortString, Var
+from modules.reader import Reader
+from modules.writer import Writer
+
+BREAK, CONTINUE, EXIT = range(3)
+
+DEFAULTS = {'integer': 0, 'real': 0.0, 'boolean': False, 'char': '\0', 'string': ''}
+
+
+BINARY = {
+    '+': lambda first, second: lambda: first() + second(),
+    '-': lambda first, second: lambda: first() - second(),
+    '*': lambda first, second: lambda: first() * second(),
+    '/': lambda first, second: lambda: first() / second(),
+    'div': lambda first, second: lambda: pascal_div(first(), second()),
+    'mod': lambda first, second: lambda: pascal_mod(first(), second()),
+    '=': lambda first, second: lambda: first() == second(),
+    '<>': lambda first, second: lambda: first() != second(),
+    '<': lambda first, second: lambda: first() < second(),
+    '>': lambda first, second: lambda: first() > second(),
+    '<=': lambda first, second: lambda: first() <= second(),
+    '>=': lambda first, second: lambda: first() >= second(),
+    'and': lambda first, second: lambda: first() and second(),
+    'or': lambda first, second: lambda: first() or second(),
+    'xor': lambda first, second: lambda: first() ^ second(),
+}
+
+
+class Routine:
+    def __init__(self, id_, result):
+        self.id_ = id_
+        self.result = result
+        self.template = None
+        self.arrays = None
+        self.body = None
+
+
+class Compiler(Visitor):
+    def __init__(self, ast, max_depth=10000):
+        super().__init__()
+        self.ast = ast
+        self.max_depth = max_depth
+        self.nesting = 0
+        self.base = None
+        self.height = 0
+        self.globals = []
+        self.stack = []
+        self.scopes = []
+        self.types = []
+        self.routines = {}
+        self.writer = Writer()
+        self.reader = Reader(flush=self.writer.flush)
+        self.main = None
+
+    # every variable is a slot, depth 0 lives in the globals list, depth 1 in the frame on top of the stack
+    def get_slot(self, id_):
+        for depth in reversed(range(len(self.scopes))):
+            if id_ in self.scopes[depth]:
+                return depth, self.scopes[depth][id_]
+        self.die_id(id_)
+
+    def get_type(self, id_):
+        depth, _ = self.get_slot(id_)
+        return self.types[depth].get(id_)
+
+    def load(self, node):
+        depth, slot = self.get_slot(node.value)
+        if depth == 0:
+            globals_ = self.globals
+            return lambda: globals_[slot]
+        stack = self.stack
+        return lambda: stack[-1][slot]
+
+    def store(self, node):
+        if isinstance(node, ArrayElem):
+            array = self.load(node.id_)
+            index = self.visit(node, node.index)
+
+            def store_elem(value):
+                array()[index()] = value
+
+            return store_elem
+        depth, slot = self.get_slot(node.value)
+        if depth == 0:
+            globals_ = self.globals
+
+            def store_global(value):
+                globals_[slot] = value
+
+            return store_global
+        stack = self.stack
+
+        def store_local(value):
+            stack[-1][slot] = value
+
+        return store_local
+
+    def open_scope(self, symbols):
+        scope = {}
+        types = {}
+        for s in symbols:
+            scope[s.id_] = len(scope)
+            types[s.id_] = s.type_
+        self.scopes.append(scope)
+        self.types.append(types)
+        return scope
+
+    def declare(self, scope, declarations):
+        # plain values are copied from a template, arrays get a fresh list on every activation
+        template = [None] * len(scope)
+        arrays = []
+        for decl in declarations:
+            slot = scope[decl.id_.value]
+            if isinstance(decl, ArrayDecl):
+                arrays.append((slot, self.visit(None, decl)))
+            elif isinstance(decl.type_, ShortString):
+                template[slot] = ''
+            else:
+                template[slot] = DEFAULTS.get(decl.type_.value)
+        return template, arrays
+
+    def visit_Program(self, parent, node):
+        routines = [n for n in node.nodes if isinstance(n, Func) or isinstance(n, Proc)]
+        for n in routines:
+            self.declare_routine(n)
+        scope = self.open_scope(s for s in node.symbols if s.id_ not in self.routines)
+        declarations = []
+        for n in node.nodes:
+            if isinstance(n, Var):
+                declarations.extend(n.nodes)
+        template, arrays = self.declare(scope, declarations)
+        for n in routines:
+            self.visit(node, n)
+        body = self.visit(node, node.nodes[-1])
+        globals_ = self.globals
+
+        def program():
+            globals_[:] = template
+            for slot, array in arrays:
+                globals_[slot] = array()
+            body()
+
+        return program
+
+    def declare_routine(self, node):
+        self.routines[node.id_.value] = Routine(node.id_.value, len(node.block.symbols))
+
+    # closures nest like the nodes they come from, the deepest routine body bounds the frames of one call
+    def visit(self, parent, node):
+        self.nesting += 1
+        if self.base is not None:
+            self.height = max(self.height, self.nesting - self.base)
+        try:
+            return super().visit(parent, node)
+        finally:
+            self.nesting -= 1
+
+    def visit_Func(self, parent, node):
+        return self.visit_routine(node)
+
+    def visit_Proc(self, parent, node):
+        return self.visit_routine(node)
+
+    def visit_routine(self, node):
+        routine = self.routines[node.id_.value]
+        scope = self.open_scope(node.block.symbols)
+        # the routine name inside its own body is the result variable
+        scope[routine.id_] = routine.result
+        declarations = [] if node.params is None else list(node.params.params)
+        if node.variables is not None:
+            declarations.extend(node.variables.nodes)
+        template, routine.arrays = self.declare(scope, declarations)
+        routine.template = template + [None]
+        base, self.base = self.base, self.nesting
+        routine.body = self.visit(node, node.block)
+        self.base = base
+        self.scopes.pop()
+        self.types.pop()
+
+    def visit_ArrayDecl(self, parent, node):
+        size = node.end_index.value + 1
+        default = DEFAULTS.get(node.type_.value)
+        values = []
+        if node.elems is not None:
+            values = [self.visit(node, e)() for e in node.elems.elems]
+        start = node.start_index.value
+
+        def array():
+            elems = [default] * size
+            elems[start:start + len(values)] = values
+            return elems
+
+        return array
+
+    def visit_Block(self, parent, node):
+        statements = []
+        for n in node.nodes:
+            statement = self.visit(node, n)
+            if isinstance(n, FuncProcCall):
+                statement = self.discard(statement)
+            statements.append(statement)
+
+        def block():
+            for statement in statements:
+                signal = statement()
+                if signal is not None:
+                    return signal
+
+        return block
+
+    def discard(self, call):
+        def statement():
+            call()
+
+        return statement
+
+    def visit_Assign(self, parent, node):
+        store = self.store(node.id_)
+        expr = self.visit(node, node.expr)
+
+        def assign():
+            store(expr())
+
+        return assign
+
+    def visit_If(self, parent, node):
+        cond = self.visit(node, node.cond)
+        true = self.visit(node, node.true)
+        if node.false is None:
+            def if_():
+                if cond():
+                    return true()
+
+            return if_
+        false = self.visit(node, node.false)
+
+        def if_else():
+            if cond():
+                return true()
+            return false()
+
+        return if_else
+
+    def visit_While(self, parent, node):
+        cond = self.visit(node, node.cond)
+        body = self.visit(node, node.block)
+
+        def while_():
+            while cond():
+                signal = body()
+                if signal is not None and signal != CONTINUE:
+                    if signal == BREAK:
+                        break
+                    return signal
+
+        return while_
+
+    def visit_Repeat(self, parent, node):
+        cond = self.visit(node, node.cond)
+        body = self.visit(node, node.block)
+
+        def repeat():
+            while True:
+                signal = body()
+                if signal is not None and signal != CONTINUE:
+                    if signal == BREAK:
+                        break
+                    return signal
+                if cond():
+                    break
+
+        return repeat
+
+    def visit_For(self, parent, node):
+        start = self.visit(node, node.start)
+        end = self.visit(node, node.end)
+        body = self.visit(node, node.block)
+        depth, slot = self.get_slot(node.start.id_.value)
+        step = 1 if node.type_.value == 'increment' else -1
+        globals_ = self.globals
+        stack = self.stack
+
+        # the bound is evaluated once, the counter is read back so the body may change it
+        def for_():
+            start()
+            frame = globals_ if depth == 0 else stack[-1]
+            last = end()
+            while frame[slot] * step <= last * step:
+                signal = body()
+                if signal is not None and signal != CONTINUE:
+                    if signal == BREAK:
+                        break
+                    return signal
+                frame[slot] += step
+
+        return for_
+
+    def visit_Break(self, parent, node):
+        return lambda: BREAK
+
+    def visit_Continue(self, parent, node):
+        return lambda: CONTINUE
+
+    def visit_Exit(self, parent, node):
+        if node.return_ is None:
+            return lambda: EXIT
+        value = self.visit(node, node.return_)
+        stack = self.stack
+
+        def exit_():
+            stack[-1][-1] = value()
+            return EXIT
+
+        return exit_
+
+    def visit_FuncProcCall(self, parent, node):
+        func = node.id_.value
+        args = node.args.args
+        if func == 'write' or func == 'writeln':
+            return self.write(node, args, '\n' if func == 'writeln' else '')
+        elif func == 'read' or func == 'readln':
+            return self.read(args)
+        elif func == 'ord':
+            arg = self.visit(node, args[0])
+            return lambda: ord(arg())
+        elif func == 'chr':
+            arg = self.visit(node, args[0])
+            return lambda: chr(arg())
+        elif func not in self.routines:
+            self.die_func(func)
+        return self.call(self.routines[func], [self.visit(node, a) for a in args])
+
+    def call(self, routine, args):
+        stack = self.stack
+        max_depth = self.max_depth
+        die_depth = self.die_depth
+
+        def call():
+            values = [arg() for arg in args]
+            if len(stack) == max_depth:
+                die_depth()
+            frame = routine.template.copy()
+            frame[:len(values)] = values
+            for slot, array in routine.arrays:
+                frame[slot] = array()
+            stack.append(frame)
+            routine.body()
+            stack.pop()
+            return frame[-1]
+
+        return call
+
+    def write(self, node, args, end):
+        parts = []
+        for arg in args:
+            value = self.visit(node, arg)
+            if isinstance(arg, String) or isinstance(arg, Char):
+                parts.append(value)
+            elif hasattr(arg, 'decimal'):
+                parts.append(self.decimal(value, arg.decimal.value))
+            else:
+                parts.append(self.text(value))
+        output = self.writer.write
+
+        def write():
+            output(''.join([part() for part in parts]) + end)
+
+        return write
+
+    def decimal(self, value, decimal):
+        pattern = '{:.' + str(decimal) + 'f}'
+        return lambda: pattern.format(value())
+
+    def text(self, value):
+        return lambda: str(value())
+
+    def read(self, args):
+        # the declared type picks how the input is parsed, an array element has the type of its array
+        stores = [(self.store(a), self.get_type(a.id_.value if isinstance(a, ArrayElem) else a.value)) for a in args]
+        next_value = self.reader.read
+
+        def read():
+            for store, type_ in stores:
+                store(next_value(type_))
+
+        return read
+
+    def visit_Args(self, parent, node):
+        return [self.visit(node, a) for a in node.args]
+
+    def visit_ArrayElem(self, parent, node):
+        array = self.load(node.id_)
+        index = self.visit(node, node.index)
+        return lambda: array()[index()]
+
+    def visit_Id(self, parent, node):
+        if node.value in self.routines and node.value not in self.scopes[-1]:
+            return self.call(self.routines[node.value], [])
+        return self.load(node)
+
+    def visit_Int(self, parent, node):
+        value = node.value
+        return lambda: value
+
+    def visit_Real(self, parent, node):
+        value = float(node.value)
+        return lambda: value
+
+    def visit_Char(self, parent, node):
+        value = node.value
+        return lambda: value
+
+    def visit_String(self, parent, node):
+        value = node.value
+        return lambda: value
+
+    def visit_Boolean(self, parent, node):
+        value = node.value == 'true'
+        return lambda: value
+
+    def visit_BinOp(self, parent, node):
+        if node.symbol not in BINARY:
+            self.die_operator(node.symbol)
+        first = self.visit(node, node.first)
+        second = self.visit(node, node.second)
+        return BINARY[node.symbol](first, second)
+
+    def visit_UnOp(self, parent, node):
+        first = self.visit(node, node.first)
+        if node.symbol == '-':
+            return lambda: -first()
+
+        def not_():
+            value = first()
+            return not value if isinstance(value, bool) else ~value
+
+        return not_
+
+    def compile(self):
+        if self.main is None:
+            self.main = self.visit(None, self.ast)
+        return self.main
+
+    def run(self):
+        main = self.compile()
+        try:
+            with recursion_limit((self.height + 2) * self.max_depth):
+                main()
+        finally:
+            self.writer.flush()
+
+    def die_id(self, id_):
+        raise SystemExit("Unknown identifier: {}".format(id_))
+
+    def die_func(self, func):
+        raise SystemExit("Unknown function: {}".format(func))
+
+    def die_operator(self, symbol):
+        raise SystemExit("Unknown operator: {}".format(symbol))
+
+    def die_depth(self):
+        raise SystemExit("Stack overflow: call depth exceeds {}".format(self.max_depth))
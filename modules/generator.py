@@ -1,14 +1,17 @@
-import re
+import os
 
 from modules.grapher import Visitor
-from modules.parser import Program, Var, Block, String, Char, ArrayElem, BinOp, FuncProcCall, If, For, Repeat, While, \
-    Func, Proc
+from modules.parser import Program, Var, Block, String, Char, ArrayElem, BinOp, FuncProcCall, If, For, Repeat, While
 
 
 class Generator(Visitor):
     def __init__(self, ast):
+        super().__init__()
         self.ast = ast
-        self.py = ""
+        self.write = None
+        self.line = []
+        self.first = True
+        self.indents = ['']
         self.level = 0
         self.symbol_tables = [ast.symbols]
 
@@ -18,14 +21,26 @@ class Generator(Visitor):
                 return curr.get(id_).type_
 
     def append(self, text):
-        self.py += str(text)
+        text = str(text)
+        while '\n' in text:
+            head, _, text = text.partition('\n')
+            self.line.append(head)
+            self.newline()
+        if len(text) > 0:
+            self.line.append(text)
 
+    # whitespace-only lines are dropped here instead of being cleaned out of the whole text afterwards
     def newline(self):
-        self.append('\n')
+        line = ''.join(self.line)
+        self.line = []
+        if self.first or len(line) > 0 and not line.isspace():
+            self.write(line + '\n')
+        self.first = False
 
     def indent(self):
-        for i in range(self.level):
-            self.append('\t')
+        while len(self.indents) <= self.level:
+            self.indents.append(self.indents[-1] + '\t')
+        self.append(self.indents[self.level])
 
     def open_scope(self):
         self.indent()
@@ -199,6 +214,9 @@ class Generator(Visitor):
     def visit_Int(self, parent, node):
         self.append(node.value)
 
+    def visit_Real(self, parent, node):
+        self.append(node.value)
+
     def visit_BinOp(self, parent, node):
         self.visit(node, node.first)
         if node.symbol == '=':
@@ -404,9 +422,27 @@ class Generator(Visitor):
         elif node.value == 'false':
             self.append("0")
 
-    def generate(self, path):
+    def emit(self, write):
+        self.write = write
+        self.line = []
+        self.first = True
         self.visit(None, self.ast)
-        self.py = re.sub('\n\s*\n', '\n', self.py)
-        with open(path, 'w') as source:
-            source.write(self.py)
+        write(''.join(self.line))
+        self.line = []
+
+    def source(self):
+        chunks = []
+        self.emit(chunks.append)
+        return ''.join(chunks)
+
+    def generate(self, path):
+        temp = '{}.{}'.format(path, os.getpid())
+        try:
+            with open(temp, 'w') as source:
+                self.emit(source.write)
+            os.replace(temp, path)
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
         return path
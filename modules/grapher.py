@@ -1,10 +1,27 @@
 from graphviz import Source, Digraph
 
+from modules.parser import Node
+
+
+def node_types(base=Node):
+    for type_ in base.__subclasses__():
+        yield type_
+        yield from node_types(type_)
+
 
 class Visitor():
+    # node type to bound visit method, built once per visitor instead of a getattr on every visit
+    def __init__(self):
+        self.dispatch = {}
+        for type_ in node_types():
+            method = getattr(self, 'visit_' + type_.__name__, None)
+            if method is not None:
+                self.dispatch[type_] = method
+
     def visit(self, parent, node):
-        method = 'visit_' + type(node).__name__
-        visitor = getattr(self, method, self.die)
+        visitor = self.dispatch.get(type(node))
+        if visitor is None:
+            return self.die(parent, node)
         return visitor(parent, node)
 
     def die(self, parent, node):
@@ -14,6 +31,7 @@ class Visitor():
 
 class Grapher(Visitor):
     def __init__(self, ast):
+        super().__init__()
         self.ast = ast
         self._count = 1
         self.dot = Digraph()
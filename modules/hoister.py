@@ -0,0 +1,311 @@
+from modules.grapher import Visitor
+from modules.parser import ArrayElem, Assign, BinOp, Block, Boolean, Char, Decl, Exit, For, Func, FuncProcCall, Id, \
+    If, Int, Proc, Real, Repeat, Type, UnOp, Var, While
+
+COMPARISONS = ('=', '<>', '<', '>', '<=', '>=')
+
+# these may fail at run time, hoisting them could raise for a loop that never runs
+PARTIAL = ('div', 'mod', '/')
+
+SCALARS = ('integer', 'real', 'boolean', 'char')
+
+BUILTINS = {'ord': 'integer', 'chr': 'char'}
+
+
+class Hoister(Visitor):
+    def __init__(self, ast):
+        super().__init__()
+        self.ast = ast
+        self.routine = None
+        self.routines = set()
+        self.temps = set()
+        self.defined = set()
+        self.count = 0
+        self.hoisted = 0
+
+    def lookup(self, id_):
+        if self.routine is not None and self.routine.block.symbols.contains(id_):
+            return self.routine.block.symbols.get(id_)
+        if self.ast.symbols.contains(id_):
+            return self.ast.symbols.get(id_)
+        return None
+
+    def is_routine(self, id_):
+        return id_ in self.routines
+
+    def type_of(self, node):
+        if isinstance(node, Int):
+            return 'integer'
+        elif isinstance(node, Real):
+            return 'real'
+        elif isinstance(node, Boolean):
+            return 'boolean'
+        elif isinstance(node, Char):
+            return 'char'
+        elif isinstance(node, Id) or isinstance(node, ArrayElem) or isinstance(node, FuncProcCall):
+            id_ = node.value if isinstance(node, Id) else node.id_.value
+            symbol = self.lookup(id_)
+            if symbol is None and isinstance(node, FuncProcCall):
+                return BUILTINS.get(id_)
+            if symbol is None or symbol.type_ not in SCALARS:
+                return None
+            return symbol.type_
+        elif isinstance(node, UnOp):
+            return self.type_of(node.first)
+        elif isinstance(node, BinOp):
+            if node.symbol in COMPARISONS:
+                return 'boolean'
+            elif node.symbol == '/':
+                return 'real'
+            elif node.symbol == 'div' or node.symbol == 'mod':
+                return 'integer'
+            first = self.type_of(node.first)
+            second = self.type_of(node.second)
+            if first == second:
+                return first
+            elif {first, second} == {'integer', 'real'}:
+                return 'real'
+        return None
+
+    # every name a loop may write: assignments, reads, counters, and globals if it calls a routine
+    def assigned(self, node, names):
+        if isinstance(node, Assign):
+            target = node.id_.id_ if isinstance(node.id_, ArrayElem) else node.id_
+            names.add(target.value)
+            self.assigned(node.expr, names)
+        elif isinstance(node, FuncProcCall):
+            func = node.id_.value
+            if func == 'read' or func == 'readln':
+                for arg in node.args.args:
+                    names.add(arg.id_.value if isinstance(arg, ArrayElem) else arg.value)
+            elif self.is_routine(func):
+                for symbol in self.ast.symbols:
+                    if self.routine is None or not self.routine.block.symbols.contains(symbol.id_):
+                        names.add(symbol.id_)
+            for arg in node.args.args:
+                self.assigned(arg, names)
+        elif isinstance(node, For):
+            self.assigned(node.start, names)
+            self.assigned(node.end, names)
+            self.assigned(node.block, names)
+        elif isinstance(node, While) or isinstance(node, Repeat):
+            self.assigned(node.cond, names)
+            self.assigned(node.block, names)
+        elif isinstance(node, If):
+            self.assigned(node.cond, names)
+            self.assigned(node.true, names)
+            if node.false is not None:
+                self.assigned(node.false, names)
+        elif isinstance(node, Block):
+            for n in node.nodes:
+                self.assigned(n, names)
+        elif isinstance(node, Exit) and node.return_ is not None:
+            self.assigned(node.return_, names)
+        elif isinstance(node, BinOp):
+            self.assigned(node.first, names)
+            self.assigned(node.second, names)
+        elif isinstance(node, UnOp):
+            self.assigned(node.first, names)
+        elif isinstance(node, ArrayElem):
+            self.assigned(node.index, names)
+        return names
+
+    # names every path has assigned by now: parameters, temps, and unconditional writes earlier in the enclosing blocks
+    def is_defined(self, id_):
+        if id_ in self.defined or id_ in self.temps:
+            return True
+        return self.routine is not None and self.routine.params is not None and \
+            any(p.id_.value == id_ for p in self.routine.params.params)
+
+    def define(self, node):
+        if isinstance(node, Assign) and isinstance(node.id_, Id):
+            self.defined.add(node.id_.value)
+        elif isinstance(node, FuncProcCall) and node.id_.value in ('read', 'readln'):
+            self.defined.update(arg.value for arg in node.args.args if isinstance(arg, Id))
+        elif isinstance(node, For):
+            self.defined.add(node.start.id_.value)
+
+    # a prelude runs even when the loop does not, so its operands have to be assigned before the loop is reached
+    def invariant(self, node, names):
+        if isinstance(node, Int) or isinstance(node, Real) or isinstance(node, Boolean) or isinstance(node, Char):
+            return True
+        elif isinstance(node, Id):
+            return node.value not in names and not self.is_routine(node.value) and self.is_defined(node.value)
+        elif isinstance(node, BinOp):
+            return node.symbol not in PARTIAL and self.invariant(node.first, names) and \
+                self.invariant(node.second, names)
+        elif isinstance(node, UnOp):
+            return self.invariant(node.first, names)
+        return False
+
+    # whether evaluating the node could read something in names, a routine may read anything
+    def observes(self, node, names):
+        if isinstance(node, Id):
+            return node.value in names or self.is_routine(node.value)
+        elif isinstance(node, ArrayElem):
+            return node.id_.value in names or self.observes(node.index, names)
+        elif isinstance(node, FuncProcCall):
+            return self.is_routine(node.id_.value) or any(self.observes(arg, names) for arg in node.args.args)
+        elif isinstance(node, BinOp):
+            return self.observes(node.first, names) or self.observes(node.second, names)
+        elif isinstance(node, UnOp):
+            return self.observes(node.first, names)
+        return False
+
+    # the bound is evaluated after the counter is assigned, it may only move ahead of that when it cannot tell
+    def before_start(self, node):
+        return not self.observes(node.end, self.assigned(node.start, set()))
+
+    def temp(self, expr, type_, prelude):
+        self.count += 1
+        name = '_t{}'.format(self.count)
+        self.temps.add(name)
+        self.declare(name, type_)
+        prelude.append(Assign(Id(name), expr))
+        return Id(name)
+
+    # temps are variables of the enclosing routine, or of the main program
+    def declare(self, name, type_):
+        decl = Decl(Type(type_), Id(name))
+        if self.routine is not None:
+            if self.routine.variables is None:
+                self.routine.variables = Var([])
+            self.routine.variables.nodes.append(decl)
+            self.routine.block.symbols.put(name, type_, id(self.routine.block))
+        else:
+            nodes = self.ast.nodes
+            if len(nodes) < 2 or not isinstance(nodes[-2], Var):
+                nodes.insert(len(nodes) - 1, Var([]))
+            nodes[-2].nodes.append(decl)
+            self.ast.symbols.put(name, type_, id(self.ast))
+
+    # operands with a write format stay in place, the back ends format them by their shape
+    def hoistable(self, node, names):
+        if not isinstance(node, BinOp) and not isinstance(node, UnOp) or hasattr(node, 'decimal'):
+            return False
+        return self.invariant(node, names) and self.type_of(node) is not None
+
+    def hoist(self, node, names, prelude):
+        if self.hoistable(node, names):
+            self.hoisted += 1
+            return self.temp(node, self.type_of(node), prelude)
+        if isinstance(node, BinOp):
+            node.first = self.hoist(node.first, names, prelude)
+            node.second = self.hoist(node.second, names, prelude)
+        elif isinstance(node, UnOp):
+            node.first = self.hoist(node.first, names, prelude)
+        elif isinstance(node, ArrayElem):
+            node.index = self.hoist(node.index, names, prelude)
+        elif isinstance(node, FuncProcCall):
+            for i, arg in enumerate(node.args.args):
+                node.args.args[i] = self.hoist(arg, names, prelude)
+        return node
+
+    def is_temp(self, node):
+        return isinstance(node, Assign) and isinstance(node.id_, Id) and node.id_.value in self.temps
+
+    def hoist_statements(self, node, names, prelude):
+        if isinstance(node, Assign):
+            if isinstance(node.id_, ArrayElem):
+                node.id_.index = self.hoist(node.id_.index, names, prelude)
+            node.expr = self.hoist(node.expr, names, prelude)
+        elif isinstance(node, FuncProcCall):
+            self.hoist(node, names, prelude)
+        elif isinstance(node, If):
+            node.cond = self.hoist(node.cond, names, prelude)
+            self.hoist_statements(node.true, names, prelude)
+            if node.false is not None:
+                self.hoist_statements(node.false, names, prelude)
+        elif isinstance(node, While) or isinstance(node, Repeat):
+            node.cond = self.hoist(node.cond, names, prelude)
+            self.hoist_statements(node.block, names, prelude)
+        elif isinstance(node, For):
+            node.start.expr = self.hoist(node.start.expr, names, prelude)
+            if self.before_start(node):
+                node.end = self.hoist(node.end, names, prelude)
+            self.hoist_statements(node.block, names, prelude)
+        elif isinstance(node, Block):
+            # the temps of an inner loop move out whole when they are invariant here as well
+            nodes = []
+            for n in node.nodes:
+                if self.is_temp(n) and self.invariant(n.expr, names):
+                    prelude.append(n)
+                else:
+                    self.hoist_statements(n, names, prelude)
+                    nodes.append(n)
+            node.nodes = nodes
+        elif isinstance(node, Exit):
+            node.return_ = self.hoist(node.return_, names, prelude)
+
+    def visit_Program(self, parent, node):
+        for n in node.nodes:
+            if isinstance(n, Func) or isinstance(n, Proc):
+                self.routines.add(n.id_.value)
+        for n in node.nodes:
+            self.visit(node, n)
+
+    def visit_Var(self, parent, node):
+        pass
+
+    def visit_Func(self, parent, node):
+        self.routine = node
+        self.visit(node, node.block)
+        self.routine = None
+
+    def visit_Proc(self, parent, node):
+        self.routine = node
+        self.visit(node, node.block)
+        self.routine = None
+
+    # what a nested block assigns may not run, only the enclosing statements before it count after it
+    def visit_Block(self, parent, node):
+        defined = self.defined
+        self.defined = set() if isinstance(parent, Func) or isinstance(parent, Proc) else set(defined)
+        nodes = []
+        for n in node.nodes:
+            if isinstance(n, For) or isinstance(n, While) or isinstance(n, Repeat) or isinstance(n, If):
+                nodes.extend(self.visit(node, n))
+            else:
+                nodes.append(n)
+            self.define(n)
+        node.nodes = nodes
+        self.defined = defined
+
+    def visit_If(self, parent, node):
+        self.visit(node, node.true)
+        if node.false is not None:
+            self.visit(node, node.false)
+        return [node]
+
+    # inner loops go first, their temps are then candidates for the enclosing loop
+    def visit_loop(self, node):
+        self.visit(node, node.block)
+        names = self.assigned(node, set())
+        prelude = []
+        node.cond = self.hoist(node.cond, names, prelude)
+        self.hoist_statements(node.block, names, prelude)
+        return prelude + [node]
+
+    def visit_While(self, parent, node):
+        return self.visit_loop(node)
+
+    def visit_Repeat(self, parent, node):
+        return self.visit_loop(node)
+
+    # the bound of a for loop is evaluated once, a bound of unknown type takes the type of the counter
+    def visit_For(self, parent, node):
+        self.visit(node, node.block)
+        names = self.assigned(node, set())
+        prelude = []
+        end = node.end
+        constant = isinstance(end, Int) or isinstance(end, Char) or \
+            isinstance(end, Id) and end.value not in names and not self.is_routine(end.value)
+        if not constant and self.before_start(node):
+            self.hoisted += 1
+            node.end = self.temp(end, self.type_of(end) or self.type_of(node.start.id_), prelude)
+        self.hoist_statements(node.block, names, prelude)
+        return prelude + [node]
+
+    def optimize(self):
+        self.visit(None, self.ast)
+        return self.hoisted
@@ -1,7 +1,104 @@
+import re
+
 from modules.enums import Class
 
+KEYWORDS = {
+    'if': Class.IF,
+    'else': Class.ELSE,
+    'while': Class.WHILE,
+    'for': Class.FOR,
+    'repeat': Class.REPEAT,
+    'until': Class.UNTIL,
+    'break': Class.BREAK,
+    'continue': Class.CONTINUE,
+    'exit': Class.EXIT,
+    'var': Class.VAR,
+    'begin': Class.BEGIN,
+    'end': Class.END,
+    'array': Class.ARRAY,
+    'procedure': Class.PROCEDURE,
+    'function': Class.FUNCTION,
+    'to': Class.TO,
+    'downto': Class.DOWNTO,
+    'do': Class.DO,
+    'div': Class.DIV,
+    'mod': Class.MOD,
+    'then': Class.THEN,
+    'of': Class.OF,
+    'and': Class.AND,
+    'or': Class.OR,
+    'not': Class.NOT,
+    'xor': Class.XOR,
+    'true': Class.BOOLEAN,
+    'false': Class.BOOLEAN,
+    'integer': Class.TYPE,
+    'char': Class.TYPE,
+    'string': Class.TYPE,
+    'real': Class.TYPE,
+    'boolean': Class.TYPE,
+}
+
+SYMBOLS = {
+    '+': Class.PLUS,
+    '-': Class.MINUS,
+    '*': Class.STAR,
+    '/': Class.FWDSLASH,
+    '.': Class.DOT,
+    '=': Class.EQ,
+    '(': Class.LPAREN,
+    ')': Class.RPAREN,
+    '[': Class.LBRACKET,
+    ']': Class.RBRACKET,
+    ';': Class.SEMICOLON,
+    ',': Class.COMMA,
+}
+
+# two character operators, indexed by their first character
+COMPOUNDS = {
+    ':': (Class.COLON, {'=': Class.ASSIGN}),
+    '<': (Class.LT, {'=': Class.LTE, '>': Class.NEQ}),
+    '>': (Class.GT, {'=': Class.GTE}),
+}
+
+SPACE, LETTER, DIGIT, SYMBOL, COMPOUND, QUOTE, OTHER = range(7)
+
+
+def char_kind(char):
+    if char.isspace():
+        return SPACE
+    elif char.isalpha():
+        return LETTER
+    elif char.isdigit():
+        return DIGIT
+    elif char in SYMBOLS:
+        return SYMBOL
+    elif char in COMPOUNDS:
+        return COMPOUND
+    elif char == '\'':
+        return QUOTE
+    return OTHER
+
+
+# character classes of the ascii range, anything above falls back to char_kind
+KINDS = {chr(i): char_kind(chr(i)) for i in range(128)}
+SPACES = frozenset(c for c, kind in KINDS.items() if kind == SPACE)
+DIGITS = frozenset(c for c, kind in KINDS.items() if kind == DIGIT)
+IDENTS = frozenset(c for c, kind in KINDS.items() if kind == LETTER or kind == DIGIT) | {'_'}
+
+# master pattern, one named group per token class, keywords are looked up on ID matches
+PATTERNS = [('SPACE', r'\s+'), ('ID', r'[^\W\d_]\w*'), ('REAL', r'\d+\.\d+'), ('INT', r'\d+'),
+            ('CHAR', r"'(?s:.)'"), ('STRING', r"'[^']*'?")]
+PATTERNS += [(pairs[second].name, re.escape(first + second)) for first, (_, pairs) in COMPOUNDS.items() for second in pairs]
+PATTERNS += [(class_.name, re.escape(char)) for char, class_ in SYMBOLS.items()]
+PATTERNS += [(single.name, re.escape(char)) for char, (single, _) in COMPOUNDS.items()]
+PATTERNS += [('MISMATCH', r'(?s:.)')]
+MASTER = re.compile('|'.join('(?P<{}>{})'.format(name, pattern) for name, pattern in PATTERNS))
+GROUPS = {name: Class[name] for name, _ in PATTERNS if name in Class.__members__}
+
 
 class Token:
+    __slots__ = ('class_', 'lexeme')
+
     def __init__(self, class_, lexeme):
         self.class_ = class_
         self.lexeme = lexeme
@@ -11,10 +108,11 @@ class Token:
 
 
 class Lexer:
-    def __init__(self, text):
+    def __init__(self, text, backend='table'):
         self.text = text
         self.len = len(text)
         self.pos = -1
+        self.backend = backend
 
     def read_space(self):
         while self.pos + 1 < self.len and self.text[self.pos + 1].isspace():
@@ -40,7 +138,7 @@ class Lexer:
         return lexeme
 
     def is_only_one_char(self):
-        if self.text[self.pos + 2] == '\'':
+        if self.pos + 2 < self.len and self.text[self.pos + 2] == '\'':
             return True
         return False
 
@@ -127,7 +225,7 @@ class Lexer:
           curr = self.next_char()
           if curr == '.':
             curr = self.next_char()
-            if curr.isdigit():
+            if curr is not None and curr.isdigit():
                 secondInt = self.read_int()
                 token = Token(Class.REAL, f'{firstInt}.{secondInt}')
             else:
@@ -193,13 +291,117 @@ class Lexer:
         return token
 
     def lex(self):
-        tokens = []
+        return list(self.iter_tokens())
+
+    def iter_tokens(self):
+        if self.backend == 'table':
+            return self.scan()
+        elif self.backend == 'regex':
+            return self.tokenize()
+        elif self.backend == 'char':
+            return self.read_tokens()
+        self.die_backend()
+
+    def read_tokens(self):
         while True:
             curr = self.next_token()
-            tokens.append(curr)
+            yield curr
             if curr.class_ == Class.EOF:
                 break
-        return tokens
+
+    def scan(self):
+        # a trailing sentinel stops every run without explicit bounds checks
+        text = self.text + '\0'
+        end = self.len
+        pos = self.pos + 1
+        while True:
+            curr = text[pos]
+            while curr in SPACES:
+                pos += 1
+                curr = text[pos]
+            kind = KINDS.get(curr) or char_kind(curr)
+            start = pos
+            pos += 1
+            if kind == LETTER:
+                curr = text[pos]
+                while curr in IDENTS or curr > '\x7f' and curr.isalnum():
+                    pos += 1
+                    curr = text[pos]
+                lexeme = text[start:pos]
+                yield Token(KEYWORDS.get(lexeme, Class.ID), lexeme)
+            elif kind == SYMBOL:
+                yield Token(SYMBOLS[curr], curr)
+            elif kind == DIGIT:
+                pos = self.scan_digits(text, pos)
+                first = int(text[start:pos])
+                if text[pos] == '.' and char_kind(text[pos + 1]) == DIGIT:
+                    start = pos + 1
+                    pos = self.scan_digits(text, start + 1)
+                    yield Token(Class.REAL, f'{first}.{int(text[start:pos])}')
+                else:
+                    yield Token(Class.INT, first)
+            elif kind == COMPOUND:
+                single, pairs = COMPOUNDS[curr]
+                if text[pos] in pairs:
+                    pos += 1
+                    yield Token(pairs[text[pos - 1]], text[start:pos])
+                else:
+                    yield Token(single, curr)
+            elif kind == QUOTE:
+                if start + 2 < end and text[start + 2] == '\'':
+                    pos = start + 3
+                    yield Token(Class.CHAR, text[start + 1])
+                else:
+                    close = self.text.find('\'', pos)
+                    # an unterminated string runs to the end of the text, the sentinel then ends the scan
+                    if close < 0:
+                        close = end
+                    pos = min(close + 1, end)
+                    yield Token(Class.STRING, text[start + 1:close])
+            elif kind == SPACE:
+                continue
+            elif start >= end:
+                self.pos = end
+                yield Token(Class.EOF, None)
+                return
+            else:
+                self.pos = start
+                self.die(curr)
+
+    def tokenize(self):
+        for match in MASTER.finditer(self.text, self.pos + 1):
+            group = match.lastgroup
+            if group == 'SPACE':
+                continue
+            lexeme = match.group()
+            if group == 'ID':
+                yield Token(KEYWORDS.get(lexeme, Class.ID), lexeme)
+            elif group == 'INT':
+                yield Token(Class.INT, int(lexeme))
+            elif group == 'REAL':
+                first, second = lexeme.split('.')
+                yield Token(Class.REAL, f'{int(first)}.{int(second)}')
+            elif group == 'CHAR':
+                yield Token(Class.CHAR, lexeme[1])
+            elif group == 'STRING':
+                yield Token(Class.STRING, lexeme[1:-1] if len(lexeme) > 1 and lexeme[-1] == '\'' else lexeme[1:])
+            elif group == 'MISMATCH':
+                self.pos = match.start()
+                self.die(lexeme)
+            else:
+                yield Token(GROUPS[group], lexeme)
+        self.pos = self.len
+        yield Token(Class.EOF, None)
+
+    def scan_digits(self, text, pos):
+        curr = text[pos]
+        while curr in DIGITS or curr > '\x7f' and curr.isdigit():
+            pos += 1
+            curr = text[pos]
+        return pos
+
+    def die_backend(self):
+        raise SystemExit("Unknown lexer backend: {}".format(self.backend))
 
     def die(self, char):
         print(self.pos)
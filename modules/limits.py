@@ -0,0 +1,22 @@
+import sys
+from contextlib import contextmanager
+
+
+def stack_depth():
+    depth = 0
+    frame = sys._getframe(1)
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    return depth
+
+
+# the frames a run needs go on top of the current limit, the old limit is back once the run is over
+@contextmanager
+def recursion_limit(frames):
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(limit + frames)
+    try:
+        yield
+    finally:
+        sys.setrecursionlimit(limit)
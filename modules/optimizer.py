@@ -0,0 +1,224 @@
+from modules.arithmetic import pascal_div, pascal_mod
+from modules.grapher import Visitor
+from modules.parser import Boolean, Int, Node, Real, UnOp
+
+ARITHMETIC = {
+    '+': lambda first, second: first + second,
+    '-': lambda first, second: first - second,
+    '*': lambda first, second: first * second,
+}
+
+COMPARISONS = {
+    '=': lambda first, second: first == second,
+    '<>': lambda first, second: first != second,
+    '<': lambda first, second: first < second,
+    '>': lambda first, second: first > second,
+    '<=': lambda first, second: first <= second,
+    '>=': lambda first, second: first >= second,
+}
+
+LOGIC = {
+    'and': lambda first, second: first and second,
+    'or': lambda first, second: first or second,
+    'xor': lambda first, second: first != second,
+    '=': lambda first, second: first == second,
+    '<>': lambda first, second: first != second,
+}
+
+
+class Optimizer(Visitor):
+    def __init__(self, ast):
+        super().__init__()
+        self.ast = ast
+        self.removed = 0
+
+    def count(self, node):
+        if isinstance(node, list):
+            return sum(self.count(n) for n in node)
+        if not isinstance(node, Node):
+            return 0
+        count = 1
+        for type_ in type(node).__mro__:
+            for name in getattr(type_, '__slots__', ()):
+                if hasattr(node, name):
+                    count += self.count(getattr(node, name))
+        return count
+
+    def is_number(self, node):
+        return isinstance(node, Int) or isinstance(node, Real)
+
+    def number(self, node):
+        if isinstance(node, Real):
+            return float(node.value)
+        return node.value
+
+    def is_int(self, node, value):
+        return isinstance(node, Int) and node.value == value
+
+    def constant(self, value):
+        if isinstance(value, bool):
+            return Boolean('true' if value else 'false')
+        elif isinstance(value, int):
+            return Int(value)
+        return Real(repr(value))
+
+    def visit_Program(self, parent, node):
+        for n in node.nodes:
+            self.visit(node, n)
+        return node
+
+    def visit_Var(self, parent, node):
+        return node
+
+    def visit_Func(self, parent, node):
+        node.block = self.visit(node, node.block)
+        return node
+
+    def visit_Proc(self, parent, node):
+        node.block = self.visit(node, node.block)
+        return node
+
+    # a dead if is replaced by the statements of the branch that is taken
+    def visit_Block(self, parent, node):
+        nodes = []
+        for n in node.nodes:
+            result = self.visit(node, n)
+            if isinstance(result, list):
+                nodes.extend(result)
+            else:
+                nodes.append(result)
+        node.nodes = nodes
+        return node
+
+    def visit_If(self, parent, node):
+        node.cond = self.visit(node, node.cond)
+        node.true = self.visit(node, node.true)
+        if node.false is not None:
+            node.false = self.visit(node, node.false)
+        if not isinstance(node.cond, Boolean):
+            return node
+        taken = node.true if node.cond.value == 'true' else node.false
+        if taken is None:
+            return []
+        if len(taken.symbols) > 0:
+            return node
+        return taken.nodes
+
+    def visit_While(self, parent, node):
+        node.cond = self.visit(node, node.cond)
+        node.block = self.visit(node, node.block)
+        return node
+
+    def visit_Repeat(self, parent, node):
+        node.block = self.visit(node, node.block)
+        node.cond = self.visit(node, node.cond)
+        return node
+
+    def visit_For(self, parent, node):
+        node.start = self.visit(node, node.start)
+        node.end = self.visit(node, node.end)
+        node.block = self.visit(node, node.block)
+        return node
+
+    def visit_Assign(self, parent, node):
+        node.id_ = self.visit(node, node.id_)
+        node.expr = self.visit(node, node.expr)
+        return node
+
+    def visit_FuncProcCall(self, parent, node):
+        node.args.args = [self.visit(node.args, a) for a in node.args.args]
+        return node
+
+    def visit_Exit(self, parent, node):
+        if node.return_ is not None:
+            node.return_ = self.visit(node, node.return_)
+        return node
+
+    def visit_Break(self, parent, node):
+        return node
+
+    def visit_Continue(self, parent, node):
+        return node
+
+    def visit_ArrayElem(self, parent, node):
+        node.index = self.visit(node, node.index)
+        return node
+
+    def visit_Id(self, parent, node):
+        return node
+
+    def visit_Int(self, parent, node):
+        return node
+
+    def visit_Real(self, parent, node):
+        return node
+
+    def visit_Char(self, parent, node):
+        return node
+
+    def visit_String(self, parent, node):
+        return node
+
+    def visit_Boolean(self, parent, node):
+        return node
+
+    # operands with a write format keep their shape, the back ends format them by type
+    def visit_BinOp(self, parent, node):
+        node.first = self.visit(node, node.first)
+        node.second = self.visit(node, node.second)
+        if hasattr(node, 'decimal'):
+            return node
+        folded = self.fold(node.symbol, node.first, node.second)
+        if folded is None:
+            folded = self.simplify(node.symbol, node.first, node.second)
+        if folded is None:
+            return node
+        return folded
+
+    def fold(self, symbol, first, second):
+        if self.is_number(first) and self.is_number(second):
+            a, b = self.number(first), self.number(second)
+            if symbol in ARITHMETIC:
+                return self.constant(ARITHMETIC[symbol](a, b))
+            elif symbol in COMPARISONS:
+                return self.constant(COMPARISONS[symbol](a, b))
+            # an int / int is integer division in the generated c, only a real operand makes it the same division
+            elif symbol == '/' and b != 0 and (isinstance(first, Real) or isinstance(second, Real)):
+                return self.constant(a / b)
+            elif isinstance(first, Int) and isinstance(second, Int) and b != 0:
+                if symbol == 'div':
+                    return self.constant(pascal_div(a, b))
+                elif symbol == 'mod':
+                    return self.constant(pascal_mod(a, b))
+        elif isinstance(first, Boolean) and isinstance(second, Boolean) and symbol in LOGIC:
+            return self.constant(LOGIC[symbol](first.value == 'true', second.value == 'true'))
+        return None
+
+    def simplify(self, symbol, first, second):
+        if symbol == '*' and self.is_int(second, 1) or symbol == 'div' and self.is_int(second, 1):
+            return first
+        elif symbol == '*' and self.is_int(first, 1):
+            return second
+        elif (symbol == '+' or symbol == '-') and self.is_int(second, 0):
+            return first
+        elif symbol == '+' and self.is_int(first, 0):
+            return second
+        return None
+
+    def visit_UnOp(self, parent, node):
+        node.first = self.visit(node, node.first)
+        first = node.first
+        if node.symbol == '-' and self.is_number(first):
+            return self.constant(-self.number(first))
+        elif node.symbol == 'not' and isinstance(first, Boolean):
+            return self.constant(first.value != 'true')
+        elif isinstance(first, UnOp) and first.symbol == node.symbol:
+            return first.first
+        return node
+
+    # counting the tree before and after the pass keeps folding linear, a count per fold is quadratic on long chains
+    def optimize(self):
+        total = self.count(self.ast)
+        self.visit(None, self.ast)
+        self.removed = total - self.count(self.ast)
+        return self.removed
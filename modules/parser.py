@@ -1,4 +1,3 @@
-import pickle
 import copy
 from functools import wraps
 
@@ -6,26 +5,35 @@ from modules.enums import Class
 
 
 class Node:
-    pass
+    # passes annotate nodes after parsing, every annotation needs a slot
+    __slots__ = ('_index',)
 
 
 class Program(Node):
+    __slots__ = ('nodes', 'symbols', 'depth', 'size', 'levels', 'height')
+
     def __init__(self, nodes):
         self.nodes = nodes
 
 
 class Decl(Node):
+    __slots__ = ('type_', 'id_')
+
     def __init__(self, type_, id_):
         self.type_ = type_
         self.id_ = id_
 
 
 class Var(Node):
+    __slots__ = ('nodes',)
+
     def __init__(self, nodes):
         self.nodes = nodes
 
 
 class ArrayDecl(Node):
+    __slots__ = ('id_', 'type_', 'start_index', 'end_index', 'elems', 'symbols')
+
     def __init__(self, id_, type_, start_index, end_index, elems):
         self.id_ = id_
         self.type_ = type_
@@ -35,18 +43,24 @@ class ArrayDecl(Node):
 
 
 class ArrayElem(Node):
+    __slots__ = ('id_', 'index')
+
     def __init__(self, id_, index):
         self.id_ = id_
         self.index = index
 
 
 class Assign(Node):
+    __slots__ = ('id_', 'expr')
+
     def __init__(self, id_, expr):
         self.id_ = id_
         self.expr = expr
 
 
 class If(Node):
+    __slots__ = ('cond', 'true', 'false')
+
     def __init__(self, cond, true, false):
         self.cond = cond
         self.true = true
@@ -54,18 +68,24 @@ class If(Node):
 
 
 class While(Node):
+    __slots__ = ('cond', 'block')
+
     def __init__(self, cond, block):
         self.cond = cond
         self.block = block
 
 
 class Repeat(Node):
+    __slots__ = ('cond', 'block')
+
     def __init__(self, cond, block):
         self.cond = cond
         self.block = block
 
 
 class For(Node):
+    __slots__ = ('start', 'end', 'block', 'type_')
+
     def __init__(self, start, end, block, type_):
         self.start = start
         self.end = end
@@ -74,6 +94,8 @@ class For(Node):
 
 
 class Proc(Node):
+    __slots__ = ('id_', 'params', 'variables', 'block')
+
     def __init__(self, id_, params, variables, block):
         self.id_ = id_
         self.params = params
@@ -82,6 +104,8 @@ class Proc(Node):
 
 
 class Func(Node):
+    __slots__ = ('id_', 'params', 'type_', 'variables', 'block')
+
     def __init__(self, id_, params, type_, variables, block):
         self.id_ = id_
         self.params = params
@@ -91,85 +115,115 @@ class Func(Node):
 
 
 class FuncProcCall(Node):
+    __slots__ = ('id_', 'args')
+
     def __init__(self, id_, args):
         self.id_ = id_
         self.args = args
 
 
 class Block(Node):
+    __slots__ = ('nodes', 'symbols', 'depth', 'size')
+
     def __init__(self, nodes):
         self.nodes = nodes
 
 
 class Args(Node):
+    __slots__ = ('args',)
+
     def __init__(self, args):
         self.args = args
 
 
 class Params(Node):
+    __slots__ = ('params', 'symbols')
+
     def __init__(self, params):
         self.params = params
 
 
 class Elems(Node):
+    __slots__ = ('elems',)
+
     def __init__(self, elems):
         self.elems = elems
 
 
 class Break(Node):
-    pass
+    __slots__ = ()
 
 
 class Continue(Node):
-    pass
+    __slots__ = ()
 
 
 class Exit(Node):
+    __slots__ = ('return_',)
+
     def __init__(self, return_):
         self.return_ = return_
 
 
 class Type(Node):
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = value
 
 
 class Int(Node):
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = value
 
 
 class Real(Node):
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = value
 
 
 class Boolean(Node):
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = value
 
 
 class Char(Node):
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = value
 
 
 class String(Node):
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = value
 
 
 class ShortString(Node):
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = value
 
 
 class Id(Node):
+    __slots__ = ('value', 'depth', 'slot', 'type_')
+
     def __init__(self, value):
         self.value = value
 
 
 class BinOp(Node):
+    __slots__ = ('symbol', 'first', 'second', 'decimal')
+
     def __init__(self, symbol, first, second):
         self.symbol = symbol
         self.first = first
@@ -177,31 +231,132 @@ class BinOp(Node):
 
 
 class UnOp(Node):
+    __slots__ = ('symbol', 'first')
+
     def __init__(self, symbol, first):
         self.symbol = symbol
         self.first = first
 
 
-class Parser:
+class TokenStream:
+    # pulls tokens on demand, tokens are buffered only while a speculative parse may rewind
+    def __init__(self, tokens):
+        self.tokens = iter(tokens)
+        self.buffer = []
+        self.offset = 0
+        self.index = 0
+        self.marks = 0
+
+    def next(self):
+        if self.index < len(self.buffer):
+            token = self.buffer[self.index]
+            self.index += 1
+            return token
+        token = next(self.tokens)
+        if self.marks > 0:
+            self.buffer.append(token)
+            self.index += 1
+        else:
+            self.offset += len(self.buffer) + 1
+            self.buffer.clear()
+            self.index = 0
+        return token
+
+    def position(self):
+        return self.offset + self.index
+
+    def seek(self, position):
+        self.index = position - self.offset
+
+    def mark(self):
+        self.marks += 1
+        return self.position()
+
+    def reset(self, position):
+        self.marks -= 1
+        self.seek(position)
+
+
+class TokenCursor:
+    # already materialized tokens, advancing and rewinding only move the index
     def __init__(self, tokens):
         self.tokens = tokens
-        self.curr = tokens.pop(0)
+        self.index = 0
+
+    def next(self):
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def position(self):
+        return self.index
+
+    def seek(self, position):
+        self.index = position
+
+    def mark(self):
+        return self.index
+
+    def reset(self, position):
+        self.index = position
+
+
+class Parser:
+    def __init__(self, tokens, memo=False):
+        if isinstance(tokens, list):
+            self.tokens = TokenCursor(tokens)
+        else:
+            self.tokens = TokenStream(tokens)
+        self.curr = self.tokens.next()
         self.prev = None
+        self.speculating = 0
+        self.memo = {} if memo else None
+        self.memo_hits = 0
+        self.memo_misses = 0
 
     def restorable(call):
         @wraps(call)
         def wrapper(self, *args, **kwargs):
-            state = pickle.dumps(self.__dict__)
+            state = self.checkpoint()
+            self.speculating += 1
             result = call(self, *args, **kwargs)
-            self.__dict__ = pickle.loads(state)
+            self.speculating -= 1
+            self.restore(state)
             return result
 
         return wrapper
 
+    # packrat cache, subtrees parsed while speculating are reused by the committed parse
+    def memoized(call):
+        @wraps(call)
+        def wrapper(self, *args, **kwargs):
+            if self.memo is None:
+                return call(self, *args, **kwargs)
+            key = (call.__name__, self.tokens.position())
+            if key in self.memo:
+                self.memo_hits += 1
+                result, (position, self.curr, self.prev) = self.memo[key]
+                self.tokens.seek(position)
+                return result
+            self.memo_misses += 1
+            result = call(self, *args, **kwargs)
+            if self.speculating > 0:
+                self.memo[key] = (result, (self.tokens.position(), self.curr, self.prev))
+            return result
+
+        return wrapper
+
+    def checkpoint(self):
+        return self.tokens.mark(), self.curr, self.prev
+
+    def restore(self, state):
+        position, self.curr, self.prev = state
+        self.tokens.reset(position)
+
     def eat(self, class_):
         if self.curr.class_ == class_:
             self.prev = self.curr
-            self.curr = self.tokens.pop(0)
+            self.curr = self.tokens.next()
         else:
             self.die_type(class_.name, self.curr.class_.name)
 
@@ -388,8 +543,11 @@ class Parser:
                 self.eat(Class.SEMICOLON)
             else:
                 self.die_deriv(self.block.__name__)
+            if self.memo and self.speculating == 0:
+                self.memo.clear()
         return Block(nodes)
 
+    @memoized
     def args(self):
         args = []
 
@@ -559,6 +717,7 @@ class Parser:
                 first = BinOp(op, first, second)
         return first
 
+    @memoized
     def expression(self):
         first = self.term()
         while self.curr.class_ in [Class.PLUS, Class.MINUS]:
@@ -0,0 +1,317 @@
+from modules.arithmetic import pascal_div, pascal_mod
+import sys
+
+from modules.grapher import Visitor
+from modules.limits import recursion_limit, stack_depth
+from modules.parser import ArrayDecl, ArrayElem, Assign, Block, Char, For, Func, FuncProcCall, If, Proc, Repeat, \
+    ShortString, String, Var, While
+from modules.reader import Reader
+from modules.writer import Writer
+
+DEFAULTS = {'integer': '0', 'real': '0.0', 'boolean': 'False', 'char': repr('\0'), 'string': "''"}
+
+OPERATORS = {'=': '==', '<>': '!=', 'xor': '^'}
+
+# frames between run() and the main program, and what the runtime helpers need below the deepest call
+FRAMES = 8
+
+
+def pascal_not(value):
+    return not value if isinstance(value, bool) else ~value
+
+
+class PyGenerator(Visitor):
+    def __init__(self, ast, max_depth=10000):
+        super().__init__()
+        self.ast = ast
+        self.max_depth = max_depth
+        self.lines = []
+        self.py = None
+        self.level = 0
+        self.routines = set()
+        self.types = {}
+        self.loops = []
+        self.result = None
+        self.count = 0
+        self.writer = Writer()
+        self.reader = Reader(flush=self.writer.flush)
+
+    # pascal names get a prefix so they never shadow python keywords, builtins or the runtime helpers
+    def var(self, id_):
+        return 'v_' + id_
+
+    def routine(self, id_):
+        return 'f_' + id_
+
+    def temp(self):
+        self.count += 1
+        return '_t{}'.format(self.count)
+
+    def line(self, text):
+        self.lines.append('    ' * self.level + text + '\n')
+
+    def default(self, decl):
+        if isinstance(decl, ArrayDecl):
+            default = DEFAULTS[decl.type_.value]
+            size = decl.end_index.value + 1
+            if decl.elems is None:
+                return '[{}] * {}'.format(default, size)
+            start = decl.start_index.value
+            elems = [self.visit(decl, e) for e in decl.elems.elems]
+            return '[{0}] * {1} + [{2}] + [{0}] * {3}'.format(default, start, ', '.join(elems), size - start - len(elems))
+        if isinstance(decl.type_, ShortString):
+            return "''"
+        return DEFAULTS[decl.type_.value]
+
+    def declare(self, declarations):
+        for decl in declarations:
+            self.line('{} = {}'.format(self.var(decl.id_.value), self.default(decl)))
+
+    def assigned(self, node, names):
+        # globals written inside a routine have to be declared nonlocal
+        if isinstance(node, Assign):
+            if not isinstance(node.id_, ArrayElem):
+                names.add(node.id_.value)
+        elif isinstance(node, FuncProcCall) and node.id_.value in ('read', 'readln'):
+            for arg in node.args.args:
+                if not isinstance(arg, ArrayElem):
+                    names.add(arg.value)
+        elif isinstance(node, For):
+            self.assigned(node.start, names)
+        if isinstance(node, If):
+            children = [node.true, node.false]
+        elif isinstance(node, (While, Repeat, For)):
+            children = [node.block]
+        elif isinstance(node, Block):
+            children = node.nodes
+        else:
+            children = []
+        for child in children:
+            if child is not None:
+                self.assigned(child, names)
+        return names
+
+    def visit_Program(self, parent, node):
+        globals_ = []
+        for n in node.nodes:
+            if isinstance(n, Func) or isinstance(n, Proc):
+                self.routines.add(n.id_.value)
+            elif isinstance(n, Var):
+                globals_.extend(n.nodes)
+        self.globals = set(decl.id_.value for decl in globals_)
+        self.types = {decl.id_.value: decl.type_.value for decl in globals_}
+        self.line('def main():')
+        self.level += 1
+        self.declare(globals_)
+        for n in node.nodes:
+            if isinstance(n, Func) or isinstance(n, Proc):
+                self.visit(node, n)
+        self.visit(node, node.nodes[-1])
+        self.level -= 1
+        self.line('main()')
+
+    def visit_Func(self, parent, node):
+        self.visit_routine(node, node.id_.value)
+
+    def visit_Proc(self, parent, node):
+        self.visit_routine(node, None)
+
+    def visit_routine(self, node, result):
+        params = [] if node.params is None else node.params.params
+        variables = [] if node.variables is None else node.variables.nodes
+        locals_ = set(p.id_.value for p in params + variables)
+        types = self.types
+        self.types = dict(types)
+        self.types.update((p.id_.value, p.type_.value) for p in params + variables)
+        self.line('def {}({}):'.format(self.routine(node.id_.value), ', '.join(self.var(p.id_.value) for p in params)))
+        self.level += 1
+        nonlocal_ = sorted(name for name in self.assigned(node.block, set()) if name in self.globals - locals_)
+        if nonlocal_:
+            self.line('nonlocal ' + ', '.join(self.var(name) for name in nonlocal_))
+        self.declare(variables)
+        self.result = result
+        if result is not None:
+            self.line('{} = {}'.format(self.var(result), DEFAULTS.get(node.type_.value, 'None')))
+        self.visit(node, node.block)
+        if result is not None:
+            self.line('return ' + self.var(result))
+        self.result = None
+        self.types = types
+        self.level -= 1
+
+    # the declared type picks how the input is parsed, an array element has the type of its array
+    def type_of(self, arg):
+        return self.types.get(arg.id_.value if isinstance(arg, ArrayElem) else arg.value)
+
+    def visit_Block(self, parent, node):
+        if len(node.nodes) == 0:
+            self.line('pass')
+        for n in node.nodes:
+            if isinstance(n, FuncProcCall):
+                self.line(self.visit(node, n))
+            else:
+                self.visit(node, n)
+
+    def visit_Assign(self, parent, node):
+        self.line('{} = {}'.format(self.visit(node, node.id_), self.visit(node, node.expr)))
+
+    def visit_If(self, parent, node):
+        self.line('if {}:'.format(self.visit(node, node.cond)))
+        self.level += 1
+        self.visit(node, node.true)
+        self.level -= 1
+        if node.false is not None:
+            self.line('else:')
+            self.level += 1
+            self.visit(node, node.false)
+            self.level -= 1
+
+    def visit_loop(self, node, head, tail=None):
+        self.line(head)
+        self.level += 1
+        self.loops.append(node)
+        self.visit(node, node.block)
+        self.loops.pop()
+        if tail is not None:
+            self.line(tail)
+            self.line('    break')
+        self.level -= 1
+
+    def visit_While(self, parent, node):
+        self.visit_loop(node, 'while {}:'.format(self.visit(node, node.cond)))
+
+    def visit_Repeat(self, parent, node):
+        self.visit_loop(node, 'while True:', self.until(node))
+
+    def until(self, node):
+        return 'if {}:'.format(self.visit(node, node.cond))
+
+    # the bound is evaluated once, on normal termination the counter ends one step past it
+    def visit_For(self, parent, node):
+        self.visit(node, node.start)
+        counter = self.visit(node, node.start.id_)
+        end = self.temp()
+        self.line('{} = {}'.format(end, self.visit(node, node.end)))
+        if node.type_.value == 'increment':
+            self.visit_loop(node, 'for {0} in range({0}, {1} + 1):'.format(counter, end))
+            last = '{0} = max({0}, {1} + 1)'.format(counter, end)
+        else:
+            self.visit_loop(node, 'for {0} in range({0}, {1} - 1, -1):'.format(counter, end))
+            last = '{0} = min({0}, {1} - 1)'.format(counter, end)
+        self.line('else:')
+        self.line('    ' + last)
+
+    def visit_Break(self, parent, node):
+        self.line('break')
+
+    def visit_Continue(self, parent, node):
+        if isinstance(self.loops[-1], Repeat):
+            self.line(self.until(self.loops[-1]))
+            self.line('    break')
+        self.line('continue')
+
+    def visit_Exit(self, parent, node):
+        if node.return_ is not None:
+            self.line('return ' + self.visit(node, node.return_))
+        elif self.result is not None:
+            self.line('return ' + self.var(self.result))
+        else:
+            self.line('return')
+
+    def visit_FuncProcCall(self, parent, node):
+        func = node.id_.value
+        args = node.args.args
+        if func == 'write' or func == 'writeln':
+            parts = []
+            for arg in args:
+                if isinstance(arg, String) or isinstance(arg, Char):
+                    parts.append(self.visit(node, arg))
+                elif hasattr(arg, 'decimal'):
+                    parts.append("format({}, '.{}f')".format(self.visit(node, arg), arg.decimal.value))
+                else:
+                    parts.append('str({})'.format(self.visit(node, arg)))
+            if func == 'writeln':
+                parts.append(repr('\n'))
+            return '_write({})'.format(' + '.join(parts) if parts else "''")
+        elif func == 'read' or func == 'readln':
+            return '; '.join('{} = _read({!r})'.format(self.visit(node, a), self.type_of(a)) for a in args)
+        elif func == 'ord' or func == 'chr':
+            return '{}({})'.format(func, self.visit(node, args[0]))
+        elif func not in self.routines:
+            self.die_func(func)
+        return '{}({})'.format(self.routine(func), self.visit(node, node.args))
+
+    def visit_Args(self, parent, node):
+        return ', '.join(self.visit(node, a) for a in node.args)
+
+    def visit_ArrayElem(self, parent, node):
+        return '{}[{}]'.format(self.visit(node, node.id_), self.visit(node, node.index))
+
+    def visit_Id(self, parent, node):
+        if node.value in self.routines and node.value != self.result:
+            return '{}()'.format(self.routine(node.value))
+        return self.var(node.value)
+
+    def visit_Int(self, parent, node):
+        return str(node.value)
+
+    def visit_Real(self, parent, node):
+        return repr(float(node.value))
+
+    def visit_Char(self, parent, node):
+        return repr(node.value)
+
+    def visit_String(self, parent, node):
+        return repr(node.value)
+
+    def visit_Boolean(self, parent, node):
+        return 'True' if node.value == 'true' else 'False'
+
+    def visit_BinOp(self, parent, node):
+        first = self.visit(node, node.first)
+        second = self.visit(node, node.second)
+        if node.symbol == 'div':
+            return '_div({}, {})'.format(first, second)
+        elif node.symbol == 'mod':
+            return '_mod({}, {})'.format(first, second)
+        return '({} {} {})'.format(first, OPERATORS.get(node.symbol, node.symbol), second)
+
+    def visit_UnOp(self, parent, node):
+        if node.symbol == '-':
+            return '(-{})'.format(self.visit(node, node.first))
+        return '_not({})'.format(self.visit(node, node.first))
+
+    def generate(self, path=None):
+        if self.py is None:
+            self.visit(None, self.ast)
+            self.py = ''.join(self.lines)
+        if path is not None:
+            with open(path, 'w') as source:
+                source.write(self.py)
+        return self.py
+
+    # generated routines are plain python functions, one frame per call, so the recursion limit is the depth check
+    # and a run stops within a few calls past max_depth
+    def run(self):
+        code = compile(self.generate(), '<pascal>', 'exec')
+        namespace = {
+            '_div': pascal_div,
+            '_mod': pascal_mod,
+            '_not': pascal_not,
+            '_read': self.reader.read,
+            '_write': self.writer.write,
+        }
+        frames = stack_depth() + self.max_depth + FRAMES - sys.getrecursionlimit()
+        try:
+            with recursion_limit(frames):
+                exec(code, namespace)
+        except RecursionError:
+            self.die_depth()
+        finally:
+            self.writer.flush()
+
+    def die_func(self, func):
+        raise SystemExit("Unknown function: {}".format(func))
+
+    def die_depth(self):
+        raise SystemExit("Stack overflow: call depth exceeds {}".format(self.max_depth))
@@ -0,0 +1,63 @@
+import sys
+
+PARSERS = {'integer': int, 'real': float}
+
+
+class Reader:
+    def __init__(self, stream=None, size=1 << 16, flush=None):
+        self.stream = stream
+        self.size = size
+        self.flush = flush
+        self.tokens = []
+        self.position = 0
+        self.partial = b''
+
+    # read1 returns whatever is available, a prompt on a terminal does not wait for a full chunk
+    def fill(self):
+        if self.flush is not None:
+            self.flush()
+        stream = sys.stdin.buffer if self.stream is None else self.stream
+        read = getattr(stream, 'read1', stream.read)
+        tokens = []
+        while len(tokens) == 0:
+            chunk = read(self.size)
+            if len(chunk) == 0:
+                if len(self.partial) == 0:
+                    self.die_eof()
+                tokens, self.partial = [self.partial], b''
+                break
+            chunk = self.partial + chunk
+            tokens = chunk.split()
+            # a token cut by the end of the chunk waits for the rest of it
+            self.partial = b'' if chunk[-1:].isspace() or len(tokens) == 0 else tokens.pop()
+        self.tokens = tokens
+        self.position = 0
+
+    def token(self):
+        if self.position == len(self.tokens):
+            self.fill()
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    # the declared type of the target picks the parser, anything else is sniffed as before
+    def read(self, type_=None):
+        token = self.token()
+        if type_ in PARSERS:
+            try:
+                return PARSERS[type_](token)
+            except ValueError:
+                self.die_value(token, type_)
+        text = token.decode()
+        for parse in (int, float):
+            try:
+                return parse(text)
+            except ValueError:
+                pass
+        return text
+
+    def die_eof(self):
+        raise SystemExit("Unexpected end of input")
+
+    def die_value(self, token, type_):
+        raise SystemExit("Invalid {} input: {}".format(type_, token.decode(errors='replace')))
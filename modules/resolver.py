@@ -0,0 +1,164 @@
+from modules.grapher import Visitor
+from modules.parser import Func, Proc
+
+
+class Resolver(Visitor):
+    def __init__(self, ast):
+        super().__init__()
+        self.ast = ast
+        self.scopes = []
+        self.levels = 1
+        self.nesting = 0
+        self.base = None
+        self.height = 0
+
+    # the height is the deepest nesting below a routine, it bounds what one call puts on the stack of a tree walk
+    def visit(self, parent, node):
+        self.nesting += 1
+        if self.base is not None:
+            self.height = max(self.height, self.nesting - self.base)
+        try:
+            return super().visit(parent, node)
+        finally:
+            self.nesting -= 1
+
+    # every block is a frame at its lexical depth, the program frame is depth 0
+    def open_scope(self, node):
+        node.depth = len(self.scopes)
+        node.size = len(node.symbols)
+        self.scopes.append({s.id_: (slot, s.type_) for slot, s in enumerate(node.symbols)})
+        self.levels = max(self.levels, len(self.scopes))
+
+    def close_scope(self):
+        self.scopes.pop()
+
+    def visit_Program(self, parent, node):
+        self.open_scope(node)
+        for n in node.nodes:
+            self.visit(node, n)
+        self.close_scope()
+        node.levels = self.levels
+        node.height = self.height
+
+    def visit_Decl(self, parent, node):
+        self.visit(node, node.id_)
+
+    def visit_Var(self, parent, node):
+        for n in node.nodes:
+            self.visit(node, n)
+
+    def visit_ArrayDecl(self, parent, node):
+        self.visit(node, node.id_)
+
+    def visit_ArrayElem(self, parent, node):
+        self.visit(node, node.id_)
+        self.visit(node, node.index)
+
+    def visit_Assign(self, parent, node):
+        self.visit(node, node.id_)
+        self.visit(node, node.expr)
+
+    def visit_If(self, parent, node):
+        self.visit(node, node.cond)
+        self.visit(node, node.true)
+        if node.false is not None:
+            self.visit(node, node.false)
+
+    def visit_While(self, parent, node):
+        self.visit(node, node.cond)
+        self.visit(node, node.block)
+
+    def visit_For(self, parent, node):
+        self.visit(node, node.start)
+        self.visit(node, node.end)
+        self.visit(node, node.block)
+
+    def visit_Repeat(self, parent, node):
+        self.visit(node, node.block)
+        self.visit(node, node.cond)
+
+    def visit_Proc(self, parent, node):
+        self.visit_routine(node)
+
+    def visit_Func(self, parent, node):
+        self.visit_routine(node)
+
+    def visit_routine(self, node):
+        base, self.base = self.base, self.nesting
+        self.visit(node, node.block)
+        self.base = base
+
+    def visit_FuncProcCall(self, parent, node):
+        self.visit(node, node.args)
+
+    def visit_Block(self, parent, node):
+        self.open_scope(node)
+        # parameters and variables of a routine live in the frame of its block
+        if isinstance(parent, Func) or isinstance(parent, Proc):
+            if parent.params is not None:
+                self.visit(parent, parent.params)
+            if parent.variables is not None:
+                self.visit(parent, parent.variables)
+        for n in node.nodes:
+            self.visit(node, n)
+        self.close_scope()
+
+    def visit_Params(self, parent, node):
+        for p in node.params:
+            self.visit(node, p)
+
+    def visit_Args(self, parent, node):
+        for a in node.args:
+            self.visit(node, a)
+
+    def visit_Elems(self, parent, node):
+        pass
+
+    def visit_Break(self, parent, node):
+        pass
+
+    def visit_Continue(self, parent, node):
+        pass
+
+    def visit_Exit(self, parent, node):
+        if node.return_ is not None:
+            self.visit(node, node.return_)
+
+    def visit_Type(self, parent, node):
+        pass
+
+    def visit_Int(self, parent, node):
+        pass
+
+    def visit_Char(self, parent, node):
+        pass
+
+    def visit_String(self, parent, node):
+        pass
+
+    def visit_Boolean(self, parent, node):
+        pass
+
+    def visit_Real(self, parent, node):
+        pass
+
+    def visit_Id(self, parent, node):
+        for depth in reversed(range(len(self.scopes))):
+            if node.value in self.scopes[depth]:
+                node.depth = depth
+                node.slot, node.type_ = self.scopes[depth][node.value]
+                return
+        self.die_id(node.value)
+
+    def visit_BinOp(self, parent, node):
+        self.visit(node, node.first)
+        self.visit(node, node.second)
+
+    def visit_UnOp(self, parent, node):
+        self.visit(node, node.first)
+
+    def resolve(self):
+        self.visit(None, self.ast)
+
+    def die_id(self, id_):
+        raise SystemExit("Unknown identifier: {}".format(id_))
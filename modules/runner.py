@@ -1,56 +1,104 @@
-import re
-from _ast import Return
-import numpy as np
+from array import array
 
+from modules.arithmetic import pascal_div, pascal_mod
 from modules.grapher import Visitor
-from modules.parser import Int, Char, String, Id, Continue, Break, BinOp, FuncProcCall, Exit, ArrayElem
-from modules.symbolizer import Symbol
+from modules.limits import recursion_limit
+from modules.parser import Char, String, Continue, Break, BinOp, Exit, ArrayElem
+from modules.reader import Reader
+from modules.writer import Writer
+
+
+class Activation:
+    __slots__ = ('routine', 'slots', 'saved', 'result', 'tail')
+
+    def __init__(self, routine, slots, saved):
+        self.routine = routine
+        self.slots = slots
+        self.saved = saved
+        self.result = None
+        self.tail = None
+
+
+class Array:
+    __slots__ = ('type_', 'start', 'data')
+
+    # integers and reals are 8 byte machine values, chars and booleans a single byte
+    def __init__(self, type_, start, end):
+        size = end - start + 1
+        self.type_ = type_
+        self.start = start
+        if type_ == 'integer':
+            self.data = array('q', [0]) * size
+        elif type_ == 'real':
+            self.data = array('d', [0.0]) * size
+        elif type_ == 'char' or type_ == 'boolean':
+            self.data = bytearray(size)
+        else:
+            self.data = [None] * size
+
+    def offset(self, index):
+        offset = index - self.start
+        if offset < 0 or offset >= len(self.data):
+            raise SystemExit("Index out of range: {}".format(index))
+        return offset
+
+    def get(self, index):
+        value = self.data[self.offset(index)]
+        if self.type_ == 'char':
+            return chr(value)
+        elif self.type_ == 'boolean':
+            return value != 0
+        return value
+
+    def set(self, index, value):
+        if self.type_ == 'char':
+            value = ord(str(value))
+        elif self.type_ == 'boolean':
+            value = 1 if value else 0
+        self.data[self.offset(index)] = value
 
 
 class Runner(Visitor):
-    def __init__(self, ast):
+    def __init__(self, ast, max_depth=10000):
+        super().__init__()
         self.ast = ast
-        self.global_ = {}
-        self.local = {}
-        self.scope = []
+        self.display = []
+        self.frames = []
+        self.stack = []
+        self.max_depth = max_depth
+        self.routines = {}
         self.loop_control = None
         self.return_ = False
-        self.input_buffer = []
+        self.writer = Writer()
+        self.reader = Reader(flush=self.writer.flush)
 
-    def get_symbol(self, node):
-        id_ = node.value
-        for scope in reversed(self.scope):
-            if scope in self.local:
-                curr_scope = self.local[scope][-1]
-                if id_ in curr_scope:
-                    return curr_scope[id_]
-        return self.global_[id_]
+    # ids are resolved to (depth, slot), the display holds the current frame of every depth
+    def load(self, node):
+        return self.display[node.depth][node.slot]
 
-    def init_scope(self, node):
-        scope = id(node)
-        if scope not in self.local:
-            self.local[scope] = []
-        self.local[scope].append({})
-        for s in node.symbols:
-            self.local[scope][-1][s.id_] = s.copy()
+    def store(self, node, value):
+        if isinstance(node, ArrayElem):
+            self.load(node.id_).set(self.visit(node, node.index), value)
+        else:
+            self.display[node.depth][node.slot] = value
 
-    def clear_scope(self, node):
-        scope = id(node)
-        self.local[scope].pop()
+    # blocks without locals keep whatever frame is installed at their depth
+    def init_scope(self, node):
+        if node.size != 0:
+            self.frames.append(self.display[node.depth])
+            self.display[node.depth] = [None] * node.size
 
-    def add_to_buffer(self):
-        one_line = input().split()
-        for val  in one_line:
-            self.input_buffer.append(val)
+    def reset_scope(self, node):
+        if node.size != 0:
+            self.display[node.depth][:] = [None] * node.size
 
-    def get_from_buffer(self):
-        if len(self.input_buffer) == 0:
-            self.add_to_buffer()
-        return self.input_buffer.pop(0)
+    def clear_scope(self, node):
+        if node.size != 0:
+            self.display[node.depth] = self.frames.pop()
 
     def visit_Program(self, parent, node):
-        for s in node.symbols:
-            self.global_[s.id_] = s.copy()
+        self.display = [None] * node.levels
+        self.display[0] = [None] * node.size
         for n in node.nodes:
             self.visit(node, n)
 
@@ -59,53 +107,29 @@ class Runner(Visitor):
             self.visit(node, decl)
 
     def visit_Decl(self, parent, node):
-        id_ = self.get_symbol(node.id_)
-        id_.value = None
+        self.store(node.id_, None)
 
     def visit_ArrayDecl(self, parent, node):
-        id_ = self.get_symbol(node.id_)
-        id_.symbols = node.symbols
+        start = self.visit(node, node.start_index)
         end = self.visit(node, node.end_index)
-        size = end + 1
-        for i in range(size):
-            id_.symbols.put(i, id_.type_, None)
-            id_.symbols.get(i).value = None
-
-    def visit_ArrayElem(self, parent, node):
-        if isinstance(node.index, Id):
-            index = self.get_symbol(node.index).value
-        elif isinstance(node.index, BinOp):
-            index = self.visit(node, node.index)
-        else:
-            index = node.index.value
-        return (node.id_, index)
+        array_ = self.make_array(node.type_.value, start, end)
+        if node.elems is not None:
+            for index, elem in enumerate(node.elems.elems, start):
+                array_.set(index, self.visit(node, elem))
+        self.store(node.id_, array_)
 
-    def get_value_at_index(self, tuple_):
-        id_ = tuple_[0].value
-        index = tuple_[1]
-        return self.global_[id_].symbols.symbols[index].value
+    def make_array(self, type_, start, end):
+        return Array(type_, start, end)
 
-    def set_value_at_index(self, tuple_, val):
-        id_ = tuple_[0]
-        index = tuple_[1]
-        self.global_[id_.value].symbols.symbols[index].value = val
+    def visit_ArrayElem(self, parent, node):
+        return self.load(node.id_).get(self.visit(node, node.index))
 
     def visit_Assign(self, parent, node):
-        id_ = self.visit(node, node.id_)
-        value = self.visit(node, node.expr)
-        # get value
-        if isinstance(value, tuple):
-            value = self.get_value_at_index(value)
-        elif isinstance(value, Symbol):
-            value = value.value
-
-        # assign value
-        if isinstance(id_, tuple):
-            self.set_value_at_index(id_, value)
-        else:
-            id_.value = value
+        self.store(node.id_, self.visit(node, node.expr))
 
     def has_break_occured(self):
+        if self.return_:
+            return True
         if self.loop_control == 'break':
             self.loop_control = None
             return True
@@ -115,8 +139,6 @@ class Runner(Visitor):
 
     def visit_If(self, parent, node):
         cond = self.visit(node, node.cond)
-        if isinstance(cond, Symbol):
-            cond = cond.value
         if cond:
             self.init_scope(node.true)
             self.visit(node, node.true)
@@ -129,25 +151,16 @@ class Runner(Visitor):
 
     def visit_While(self, parent, node):
         cond = self.visit(node, node.cond)
+        self.init_scope(node.block)
         while cond:
-            self.init_scope(node.block)
             self.visit(node, node.block)
-            self.clear_scope(node.block)
             if self.has_break_occured():
                 break
+            self.reset_scope(node.block)
             cond = self.visit(node, node.cond)
+        self.clear_scope(node.block)
 
-    def check_condition(self, first, second, type_):
-        if isinstance(first, Id):
-            val_first = self.get_symbol(first).value
-        else:
-            val_first = first.value
-        if isinstance(second, Id):
-            val_second = self.get_symbol(second).value
-        elif isinstance(second, BinOp):
-            val_second = self.visit(None, second)
-        else:
-            val_second = second.value
+    def in_range(self, val_first, val_second, type_):
         val_first = self.cast(val_first)
         val_second = self.cast(val_second)
         if type_ == 'increment':
@@ -159,58 +172,41 @@ class Runner(Visitor):
     def visit_For(self, parent, node):
         self.visit(node, node.start)
         first = node.start.id_
-        second = node.end
+        # the bound is evaluated once, after the counter is assigned
+        second = self.visit(node, node.end)
         type_ = self.visit(node, node.type_)
-        cond = self.check_condition(first, second, type_)
+        cond = self.in_range(self.load(first), second, type_)
+        self.init_scope(node.block)
         while cond:
-            self.init_scope(node.block)
             self.visit(node, node.block)
-            self.clear_scope(node.block)
             if self.has_break_occured():
                 break
+            self.reset_scope(node.block)
             if type_ == 'increment':
-                self.get_symbol(first).value += 1
+                self.store(first, self.load(first) + 1)
             elif type_ == 'decrement':
-                self.get_symbol(first).value -= 1
-            cond = self.check_condition(first, second, type_)
+                self.store(first, self.load(first) - 1)
+            cond = self.in_range(self.load(first), second, type_)
+        self.clear_scope(node.block)
 
     def visit_Repeat(self, parent, node):
         cond = self.visit(node, node.cond)
+        self.init_scope(node.block)
         while True:
-            self.init_scope(node.block)
             self.visit(node, node.block)
-            self.clear_scope(node.block)
             if self.has_break_occured():
                 break
             cond = self.visit(node, node.cond)
             if cond:
                 break
+            self.reset_scope(node.block)
+        self.clear_scope(node.block)
 
     def visit_Func(self, parent, node):
-        id_ = self.get_symbol(node.id_)
-        id_.params = node.params
-        id_.block = node.block
+        self.routines[node.id_.value] = node
 
     def visit_Proc(self, parent, node):
-        id_ = self.get_symbol(node.id_)
-        id_.params = node.params
-        id_.block = node.block
-
-    def my_ord(self, node, arg):
-        if isinstance(arg, Id):
-            symb = self.get_symbol(arg)
-            val = symb.value
-        else:
-            val = self.visit(node, arg)
-        return ord(val)
-
-    def my_chr(self, node, arg):
-        if isinstance(arg, Id):
-            symb = self.get_symbol(arg)
-            char = symb.value
-        else:
-            char = self.visit(node, arg)
-        return chr(char)
+        self.routines[node.id_.value] = node
 
     def is_float(self, x):
         try:
@@ -232,58 +228,62 @@ class Runner(Visitor):
     def visit_FuncProcCall(self, parent, node):
         func = node.id_.value
         args = node.args.args
-        if func == 'write' or func == 'writeln':
-            format_ = ""
+        if func == 'read' or func == 'readln':
             for arg in args:
-                curr = self.visit(node, arg)
+                id_ = arg.id_ if isinstance(arg, ArrayElem) else arg
+                self.store(arg, self.reader.read(id_.type_))
+        elif func in self.routines:
+            # arguments are evaluated in the caller, before the frame of the callee is installed
+            return self.call(self.routines[func], self.visit(node, node.args))
+        else:
+            return self.builtin(func, args, self.visit(node, node.args))
+
+    def builtin(self, func, args, values):
+        if func == 'write' or func == 'writeln':
+            parts = []
+            for arg, curr in zip(args, values):
                 if isinstance(arg, String) or isinstance(arg, Char):
-                    format_ += curr
+                    parts.append(curr)
                 elif isinstance(arg, BinOp) and hasattr(arg, 'decimal'):
-                    format_ += "{:.2f}".format(curr)
-                elif isinstance(curr, Symbol):
-                    format_ += str(curr.value)
-                elif isinstance(curr, tuple):
-                    format_ += str(self.get_value_at_index(curr))
+                    parts.append("{:.2f}".format(curr))
                 else:
-                    format_ += str(curr)
+                    parts.append(str(curr))
             if func == 'writeln':
-                print(format_)
-            else:
-                print(format_, end='')
-        elif func == 'read' or func == 'readln':
-            for i in range(len(args)):
-                input_ = self.get_from_buffer()
-                if self.is_int(input_):
-                    input_ = int(input_)
-                elif self.is_float(input_):
-                    input_ = float(input_)
-                if isinstance(node.args.args[0], ArrayElem):
-                    id_ = self.visit(node.args, args[0])
-                else:
-                    id_ = self.visit(node.args, args[i])
-                if isinstance(id_, tuple):
-                    self.set_value_at_index(id_, input_)
-                else:
-                    id_.value = input_
+                parts.append('\n')
+            self.writer.write(''.join(parts))
         elif func == 'ord':
-            return self.my_ord(node, args[0])
+            return ord(values[0])
         elif func == 'chr':
-            return self.my_chr(node, args[0])
+            return chr(values[0])
         else:
-            impl = self.global_[func]
-            self.init_scope(impl.block)
-            result = self.visit(node, impl.block)
-            self.clear_scope(impl.block)
-            self.return_ = False
-            return result
+            self.die_func(func)
+
+    # parameters take the first slots of the routine block, its variables the rest
+    def call(self, impl, values):
+        activation = self.activate(impl, values)
+        self.visit(impl, impl.block)
+        return self.deactivate(activation)
+
+    def activate(self, impl, values):
+        if len(self.stack) == self.max_depth:
+            self.die_depth()
+        block = impl.block
+        slots = [None] * block.size
+        slots[:len(values)] = values
+        activation = Activation(impl, slots, self.display[block.depth])
+        self.stack.append(activation)
+        self.display[block.depth] = slots
+        if impl.variables is not None:
+            self.visit(impl, impl.variables)
+        return activation
+
+    def deactivate(self, activation):
+        self.display[activation.routine.block.depth] = activation.saved
+        self.stack.pop()
+        self.return_ = False
+        return activation.result
 
     def visit_Block(self, parent, node):
-        result = None
-        scope = id(node)
-        self.scope.append(scope)
-        # first visit block to change the scope, then add params to curr scope
-        if isinstance(parent, FuncProcCall):
-            self.visit(parent, parent.args)
         for n in node.nodes:
             if self.return_:
                 break
@@ -294,9 +294,11 @@ class Runner(Visitor):
                 self.loop_control = 'continue'
                 break
             elif isinstance(n, Exit):
-                self.return_ = True
                 if n.return_ is not None:
                     result = self.visit(n, n.return_)
+                    if len(self.stack) > 0:
+                        self.stack[-1].result = result
+                self.return_ = True
             else:
                 # if break or continue occuered,
                 # stop handling next instructions and
@@ -304,20 +306,12 @@ class Runner(Visitor):
                 if self.loop_control is not None:
                     break
                 self.visit(node, n)
-        self.scope.pop()
-        return result
 
     def visit_Params(self, parent, node):
         pass
 
     def visit_Args(self, parent, node):
-        func = parent.id_.value
-        impl = self.global_[func]
-        for p, a in zip(impl.params.params, node.args):
-            curr_arg = self.visit(impl.block, a)
-            arg = self.global_[curr_arg.id_]
-            id_ = self.visit(impl.block, p.id_)
-            id_.value = arg.value
+        return [self.visit(parent, a) for a in node.args]
 
     def visit_Elems(self, parent, node):
         pass
@@ -337,6 +331,9 @@ class Runner(Visitor):
     def visit_Int(self, parent, node):
         return node.value
 
+    def visit_Real(self, parent, node):
+        return float(node.value)
+
     def visit_Char(self, parent, node):
         return node.value
 
@@ -349,15 +346,11 @@ class Runner(Visitor):
         return True
 
     def visit_Id(self, parent, node):
-        return self.get_symbol(node)
+        return self.load(node)
 
     def cast(self, symb):
-        if isinstance(symb, tuple):
-            return self.get_value_at_index(symb)
-        elif isinstance(symb, Symbol):
-            num = symb.value
-            return num
-
+        if not isinstance(symb, str):
+            return symb
         if self.is_int(symb):
            return int(symb)
         elif self.is_float(symb):
@@ -366,8 +359,9 @@ class Runner(Visitor):
             return symb
 
     def visit_BinOp(self, parent, node):
-        first = self.visit(node, node.first)
-        second = self.visit(node, node.second)
+        return self.binary(node, self.visit(node, node.first), self.visit(node, node.second))
+
+    def binary(self, node, first, second):
         if node.symbol == '+':
             return self.cast(first) + self.cast(second)
         elif node.symbol == '-':
@@ -375,11 +369,11 @@ class Runner(Visitor):
         elif node.symbol == '*':
             return self.cast(first) * self.cast(second)
         elif node.symbol == 'div':
-            return self.cast(first) // self.cast(second)
+            return pascal_div(self.cast(first), self.cast(second))
         elif node.symbol == '/':
             return self.cast(first) / self.cast(second)
         elif node.symbol == 'mod':
-            return self.cast(first) % self.cast(second)
+            return pascal_mod(self.cast(first), self.cast(second))
         elif node.symbol == '=':
             return self.cast(first) == self.cast(second)
         elif node.symbol == '!=':
@@ -400,9 +394,9 @@ class Runner(Visitor):
             return None
 
     def visit_UnOp(self, parent, node):
-        first = self.visit(node, node.first)
-        if isinstance(first, Symbol):
-            first = first.value
+        return self.unary(node, self.visit(node, node.first))
+
+    def unary(self, node, first):
         if node.symbol == '-':
             return -first
         elif node.symbol == '!':
@@ -411,5 +405,21 @@ class Runner(Visitor):
         else:
             return None
 
+    # a call walks down the routine body, two python frames per level of it plus the call itself
+    def recursion_frames(self):
+        if self.ast.height == 0:
+            return 0
+        return (2 * self.ast.height + 4) * self.max_depth
+
     def run(self):
-        self.visit(None, self.ast)
+        try:
+            with recursion_limit(self.recursion_frames()):
+                self.visit(None, self.ast)
+        finally:
+            self.writer.flush()
+
+    def die_func(self, func):
+        raise SystemExit("Unknown function: {}".format(func))
+
+    def die_depth(self):
+        raise SystemExit("Stack overflow: call depth exceeds {}".format(self.max_depth))
@@ -50,6 +50,7 @@ class Symbols:
 
 class Symbolizer(Visitor):
     def __init__(self, ast):
+        super().__init__()
         self.ast = ast
 
     # some predefined functions
@@ -0,0 +1,221 @@
+from types import GeneratorType
+
+from modules.parser import ArrayElem, Assign, BinOp, Block, Break, Continue, Exit, For, FuncProcCall, If, Repeat, \
+    UnOp, While
+from modules.runner import Runner
+
+
+class Trampoline(Runner):
+    def __init__(self, ast, max_depth=1000000):
+        super().__init__(ast, max_depth)
+        self.calls = {}
+        self.steps = {
+            Block: self.step_Block,
+            If: self.step_If,
+            While: self.step_While,
+            For: self.step_For,
+            Repeat: self.step_Repeat,
+            Assign: self.step_Assign,
+            FuncProcCall: self.step_FuncProcCall,
+            ArrayElem: self.step_ArrayElem,
+            BinOp: self.step_BinOp,
+            UnOp: self.step_UnOp,
+        }
+
+    # a call from the plain tree walk starts a trampoline, calls inside it only push continuations
+    def call(self, impl, values):
+        return self.bounce(self.step_call(impl, values))
+
+    def bounce(self, routine):
+        continuations = [routine]
+        value = None
+        while True:
+            try:
+                child = continuations[-1].send(value)
+            except StopIteration as stop:
+                continuations.pop()
+                if len(continuations) == 0:
+                    return stop.value
+                value = stop.value
+                continue
+            if isinstance(child, GeneratorType):
+                continuations.append(child)
+                value = None
+            else:
+                value = child
+
+    # nodes without a call to a routine are walked as usual, the rest is suspended at every call
+    def step(self, parent, node):
+        if self.has_call(node):
+            return self.steps[type(node)](parent, node)
+        return self.visit(parent, node)
+
+    def has_call(self, node):
+        if node not in self.calls:
+            if isinstance(node, FuncProcCall) and node.id_.value in self.routines:
+                self.calls[node] = True
+            else:
+                self.calls[node] = any(self.has_call(child) for child in self.children(node))
+        return self.calls[node]
+
+    def children(self, node):
+        if isinstance(node, BinOp):
+            return [node.first, node.second]
+        elif isinstance(node, UnOp):
+            return [node.first]
+        elif isinstance(node, ArrayElem):
+            return [node.index]
+        elif isinstance(node, Assign):
+            return [node.id_, node.expr]
+        elif isinstance(node, If):
+            return [node.cond, node.true] if node.false is None else [node.cond, node.true, node.false]
+        elif isinstance(node, While) or isinstance(node, Repeat):
+            return [node.cond, node.block]
+        elif isinstance(node, For):
+            return [node.start, node.end, node.block]
+        elif isinstance(node, Block):
+            return node.nodes
+        elif isinstance(node, FuncProcCall):
+            return node.args.args
+        elif isinstance(node, Exit) and node.return_ is not None:
+            return [node.return_]
+        return []
+
+    # a self tail call reuses the activation, the body runs again with the new arguments
+    def step_call(self, impl, values):
+        activation = self.activate(impl, values)
+        while True:
+            yield self.step_Block(impl, impl.block)
+            if activation.tail is None:
+                break
+            values, activation.tail = activation.tail, None
+            activation.slots[:] = [None] * len(activation.slots)
+            activation.slots[:len(values)] = values
+            if impl.variables is not None:
+                self.visit(impl, impl.variables)
+            self.return_ = False
+        return self.deactivate(activation)
+
+    def is_tail_call(self, node):
+        return isinstance(node, FuncProcCall) and len(self.stack) > 0 and \
+            node.id_.value == self.stack[-1].routine.id_.value
+
+    def step_Block(self, parent, node):
+        for n in node.nodes:
+            if self.return_:
+                break
+            if isinstance(n, Break):
+                self.loop_control = 'break'
+                break
+            if isinstance(n, Continue):
+                self.loop_control = 'continue'
+                break
+            elif isinstance(n, Exit):
+                if n.return_ is not None:
+                    if self.is_tail_call(n.return_):
+                        self.stack[-1].tail = yield self.step_args(n.return_)
+                    else:
+                        result = yield self.step(n, n.return_)
+                        if len(self.stack) > 0:
+                            self.stack[-1].result = result
+                self.return_ = True
+            else:
+                if self.loop_control is not None:
+                    break
+                yield self.step(node, n)
+
+    def step_If(self, parent, node):
+        cond = yield self.step(node, node.cond)
+        if cond:
+            self.init_scope(node.true)
+            yield self.step(node, node.true)
+            self.clear_scope(node.true)
+        else:
+            if node.false is not None:
+                self.init_scope(node.false)
+                yield self.step(node, node.false)
+                self.clear_scope(node.false)
+
+    def step_While(self, parent, node):
+        cond = yield self.step(node, node.cond)
+        self.init_scope(node.block)
+        while cond:
+            yield self.step(node, node.block)
+            if self.has_break_occured():
+                break
+            self.reset_scope(node.block)
+            cond = yield self.step(node, node.cond)
+        self.clear_scope(node.block)
+
+    def step_For(self, parent, node):
+        yield self.step(node, node.start)
+        first = node.start.id_
+        type_ = node.type_.value
+        second = yield self.step(node, node.end)
+        cond = self.in_range(self.load(first), second, type_)
+        self.init_scope(node.block)
+        while cond:
+            yield self.step(node, node.block)
+            if self.has_break_occured():
+                break
+            self.reset_scope(node.block)
+            if type_ == 'increment':
+                self.store(first, self.load(first) + 1)
+            elif type_ == 'decrement':
+                self.store(first, self.load(first) - 1)
+            cond = self.in_range(self.load(first), second, type_)
+        self.clear_scope(node.block)
+
+    def step_Repeat(self, parent, node):
+        self.init_scope(node.block)
+        while True:
+            yield self.step(node, node.block)
+            if self.has_break_occured():
+                break
+            cond = yield self.step(node, node.cond)
+            if cond:
+                break
+            self.reset_scope(node.block)
+        self.clear_scope(node.block)
+
+    def step_Assign(self, parent, node):
+        value = yield self.step(node, node.expr)
+        if isinstance(node.id_, ArrayElem):
+            index = yield self.step(node.id_, node.id_.index)
+            self.load(node.id_.id_).set(index, value)
+        else:
+            self.store(node.id_, value)
+
+    def step_args(self, node):
+        values = []
+        for a in node.args.args:
+            values.append((yield self.step(node, a)))
+        return values
+
+    def step_FuncProcCall(self, parent, node):
+        func = node.id_.value
+        if func == 'read' or func == 'readln':
+            return self.visit(parent, node)
+        values = yield self.step_args(node)
+        if func in self.routines:
+            return (yield self.step_call(self.routines[func], values))
+        return self.builtin(func, node.args.args, values)
+
+    def step_ArrayElem(self, parent, node):
+        index = yield self.step(node, node.index)
+        return self.load(node.id_).get(index)
+
+    def step_BinOp(self, parent, node):
+        first = yield self.step(node, node.first)
+        second = yield self.step(node, node.second)
+        return self.binary(node, first, second)
+
+    def step_UnOp(self, parent, node):
+        first = yield self.step(node, node.first)
+        return self.unary(node, first)
+
+    def run(self):
+        try:
+            self.visit(None, self.ast)
+        finally:
+            self.writer.flush()
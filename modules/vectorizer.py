@@ -0,0 +1,242 @@
+import numpy as np
+
+from modules.arithmetic import pascal_div, pascal_mod
+from modules.parser import ArrayElem, Assign, BinOp, Id, Int, Real, UnOp
+from modules.runner import Array, Runner
+
+DTYPES = {'integer': np.int64, 'real': np.float64, 'char': np.uint8, 'boolean': np.uint8}
+
+OPERATORS = {
+    '+': np.add,
+    '-': np.subtract,
+    '*': np.multiply,
+    '/': np.true_divide,
+    'div': pascal_div,
+    'mod': pascal_mod,
+}
+
+DIVISIONS = ('/', 'div', 'mod')
+
+# int64 wraps silently where the scalar loop has unbounded ints, and ints past 2 ** 53 lose bits on the way to float64
+INT64 = 2 ** 63
+FLOAT64 = 2 ** 53
+
+
+class NumpyArray(Array):
+    __slots__ = ()
+
+    def __init__(self, type_, start, end):
+        size = end - start + 1
+        self.type_ = type_
+        self.start = start
+        if type_ in DTYPES:
+            self.data = np.zeros(size, DTYPES[type_])
+        else:
+            self.data = [None] * size
+
+    def get(self, index):
+        value = super().get(index)
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+
+    def window(self, first, last):
+        return self.data[first - self.start:last - self.start + 1]
+
+    def contains(self, first, last):
+        return self.type_ in ('integer', 'real') and self.start <= first and last - self.start < len(self.data)
+
+
+def same(first, second):
+    return first.depth == second.depth and first.slot == second.slot
+
+
+class Vectorizer(Runner):
+    def __init__(self, ast, max_depth=10000):
+        super().__init__(ast, max_depth)
+        self.idioms = {}
+        self.vectorized = 0
+
+    def make_array(self, type_, start, end):
+        return NumpyArray(type_, start, end)
+
+    # x[i] := expr(i) covers maps, copies and fills, s := s + expr(i) covers sums
+    def idiom(self, node):
+        counter = node.start.id_
+        if len(node.block.nodes) != 1 or not isinstance(node.block.nodes[0], Assign):
+            return None
+        stmt = node.block.nodes[0]
+        target = stmt.id_
+        if not self.elementwise(node.start.expr, None) or not self.elementwise(node.end, None):
+            return None
+        if isinstance(target, ArrayElem):
+            if not isinstance(target.index, Id) or not same(target.index, counter):
+                return None
+            if not self.elementwise(stmt.expr, counter):
+                return None
+            written = target.id_
+            kind = 'map'
+            terms = [stmt.expr]
+        else:
+            terms = self.terms(stmt.expr, target)
+            if same(target, counter) or terms is None:
+                return None
+            for term in terms:
+                if not self.elementwise(term, counter) or any(same(id_, target) for id_ in self.ids(term)):
+                    return None
+            written = target
+            kind = 'sum'
+        for id_ in self.ids(node.start.expr) + self.ids(node.end):
+            if same(id_, counter) or same(id_, written):
+                return None
+        return kind, written, terms
+
+    # s + a + b parses as (s + a) + b, the accumulator is the leftmost operand of the chain
+    def terms(self, node, target):
+        terms = []
+        while isinstance(node, BinOp) and node.symbol == '+':
+            terms.append(node.second)
+            node = node.first
+        if len(terms) == 0 or not isinstance(node, Id) or not same(node, target):
+            return None
+        return terms[::-1]
+
+    def elementwise(self, node, counter):
+        if isinstance(node, Int) or isinstance(node, Real) or isinstance(node, Id):
+            return True
+        elif isinstance(node, ArrayElem):
+            return counter is not None and isinstance(node.index, Id) and same(node.index, counter)
+        elif isinstance(node, BinOp):
+            return node.symbol in OPERATORS and self.elementwise(node.first, counter) and \
+                self.elementwise(node.second, counter)
+        elif isinstance(node, UnOp):
+            return node.symbol == '-' and self.elementwise(node.first, counter)
+        return False
+
+    def ids(self, node):
+        if isinstance(node, Id):
+            return [node]
+        elif isinstance(node, ArrayElem):
+            return [node.id_] + self.ids(node.index)
+        elif isinstance(node, BinOp):
+            return self.ids(node.first) + self.ids(node.second)
+        elif isinstance(node, UnOp):
+            return self.ids(node.first)
+        return []
+
+    def visit_For(self, parent, node):
+        if node not in self.idioms:
+            self.idioms[node] = self.idiom(node)
+        if self.idioms[node] is None or not self.vectorize(node, *self.idioms[node]):
+            super().visit_For(parent, node)
+
+    # anything the idiom cannot prove at run time falls back to the scalar loop, so do zero divisors, values that
+    # could overflow int64 and real sums, numpy adds those pairwise instead of left to right
+    def vectorize(self, node, kind, written, terms):
+        counter = node.start.id_
+        start = self.cast(self.visit(node, node.start.expr))
+        end = self.cast(self.visit(node, node.end))
+        if not isinstance(start, int) or not isinstance(end, int):
+            return False
+        if node.type_.value == 'increment':
+            first, last, after = start, end, end + 1
+        else:
+            first, last, after = end, start, end - 1
+        if first > last:
+            self.store(counter, start)
+            return True
+        elems = [e.id_ for term in terms for e in self.elems(term)]
+        for array_ in elems + ([written] if kind == 'map' else []):
+            value = self.load(array_)
+            if not isinstance(value, NumpyArray) or not value.contains(first, last):
+                return False
+        count = last - first + 1
+        for term in terms:
+            magnitude = self.magnitude(term, counter, first, last)
+            if magnitude is None or kind == 'sum' and magnitude * count >= INT64:
+                return False
+        try:
+            vectors = [self.vector(term, counter, first, last) for term in terms]
+        except ZeroDivisionError:
+            return False
+        if kind == 'map':
+            values = vectors[0]
+            array_ = self.load(written)
+            if array_.type_ == 'integer' and np.result_type(values).kind == 'f':
+                return False
+            array_.window(first, last)[:] = values
+        else:
+            total = self.cast(self.load(written))
+            if isinstance(total, float) or any(np.result_type(values).kind == 'f' for values in vectors):
+                return False
+            for values in vectors:
+                if np.ndim(values) == 0:
+                    values = values * count
+                else:
+                    values = np.sum(values)
+                if isinstance(values, np.generic):
+                    values = values.item()
+                total = total + values
+            self.store(written, total)
+        self.store(counter, after)
+        self.vectorized += 1
+        return True
+
+    def elems(self, node):
+        if isinstance(node, ArrayElem):
+            return [node]
+        elif isinstance(node, BinOp):
+            return self.elems(node.first) + self.elems(node.second)
+        elif isinstance(node, UnOp):
+            return self.elems(node.first)
+        return []
+
+    # a bound on every integer value the term takes on the way, real values do not wrap and count as 0
+    def magnitude(self, node, counter, first, last):
+        if isinstance(node, Int):
+            bound = abs(node.value)
+        elif isinstance(node, Id) and same(node, counter):
+            bound = max(abs(first), abs(last))
+        elif isinstance(node, Id):
+            value = self.cast(self.load(node))
+            bound = abs(value) if isinstance(value, int) else 0
+        elif isinstance(node, ArrayElem):
+            window = self.load(node.id_).window(first, last)
+            bound = max(abs(window.min().item()), abs(window.max().item())) if window.dtype.kind == 'i' else 0
+        elif isinstance(node, BinOp):
+            first_bound = self.magnitude(node.first, counter, first, last)
+            second_bound = self.magnitude(node.second, counter, first, last)
+            if first_bound is None or second_bound is None:
+                return None
+            if node.symbol == '/':
+                return 0 if first_bound < FLOAT64 and second_bound < FLOAT64 else None
+            elif node.symbol == '*':
+                bound = first_bound * second_bound
+            else:
+                bound = first_bound + second_bound
+        elif isinstance(node, UnOp):
+            bound = self.magnitude(node.first, counter, first, last)
+            if bound is None:
+                return None
+        else:
+            bound = 0
+        return bound if bound < INT64 else None
+
+    def vector(self, node, counter, first, last):
+        if isinstance(node, Id):
+            if same(node, counter):
+                return np.arange(first, last + 1)
+            return self.cast(self.load(node))
+        elif isinstance(node, ArrayElem):
+            return self.load(node.id_).window(first, last)
+        elif isinstance(node, BinOp):
+            values = self.vector(node.first, counter, first, last)
+            second = self.vector(node.second, counter, first, last)
+            if node.symbol in DIVISIONS and np.any(np.equal(second, 0)):
+                raise ZeroDivisionError(node.symbol)
+            return OPERATORS[node.symbol](values, second)
+        elif isinstance(node, UnOp):
+            return np.negative(self.vector(node.first, counter, first, last))
+        elif isinstance(node, Real):
+            return float(node.value)
+        return self.visit(None, node)
@@ -0,0 +1,573 @@
+import operator
+from array import array
+
+from modules.arithmetic import pascal_div, pascal_mod
+from modules.compiler import DEFAULTS
+from modules.grapher import Visitor
+from modules.parser import ArrayDecl, ArrayElem, BinOp, Boolean, Func, FuncProcCall, Proc, Real, ShortString, Var
+from modules.reader import Reader
+from modules.writer import Writer
+
+# opcode name and the number of operands that follow it in the code
+OPCODES = [
+    ('HALT', 0), ('CONST', 1), ('LOAD_GLOBAL', 1), ('STORE_GLOBAL', 1), ('LOAD_LOCAL', 1), ('STORE_LOCAL', 1),
+    ('LOAD_ELEM_GLOBAL', 2), ('LOAD_ELEM_LOCAL', 2), ('STORE_ELEM_GLOBAL', 2), ('STORE_ELEM_LOCAL', 2),
+    ('NEW_ARRAY', 1), ('BINARY', 1), ('ADD_CONST', 1), ('SUB_CONST', 1), ('NEG', 0), ('NOT', 0), ('JUMP', 1),
+    ('JUMP_IF_FALSE', 1), ('JUMP_UNLESS', 2), ('FOR_NEXT_GLOBAL', 3), ('FOR_NEXT_LOCAL', 3), ('FOR_PREV_GLOBAL', 3),
+    ('FOR_PREV_LOCAL', 3), ('CALL', 1), ('RETURN', 1), ('POP', 0), ('WRITE', 0), ('WRITE_FORMAT', 1), ('READ', 1),
+    ('ORD', 0), ('CHR', 0),
+]
+
+HALT, CONST, LOAD_GLOBAL, STORE_GLOBAL, LOAD_LOCAL, STORE_LOCAL, \
+    LOAD_ELEM_GLOBAL, LOAD_ELEM_LOCAL, STORE_ELEM_GLOBAL, STORE_ELEM_LOCAL, \
+    NEW_ARRAY, BINARY, ADD_CONST, SUB_CONST, NEG, NOT, JUMP, \
+    JUMP_IF_FALSE, JUMP_UNLESS, FOR_NEXT_GLOBAL, FOR_NEXT_LOCAL, FOR_PREV_GLOBAL, \
+    FOR_PREV_LOCAL, CALL, RETURN, POP, WRITE, WRITE_FORMAT, READ, \
+    ORD, CHR = range(len(OPCODES))
+
+# binary operators share one opcode, the operand picks the function
+OPERATORS = {
+    '+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.truediv, 'div': pascal_div,
+    'mod': pascal_mod, '=': operator.eq, '<>': operator.ne, '<': operator.lt, '>': operator.gt, '<=': operator.le,
+    '>=': operator.ge, 'and': lambda first, second: first and second, 'or': lambda first, second: first or second,
+    'xor': operator.ne,
+}
+
+SYMBOLS = list(OPERATORS)
+
+FUNCTIONS = list(OPERATORS.values())
+
+COMPARISONS = ('=', '<>', '<', '>', '<=', '>=')
+
+# a constant right operand of these is folded into the instruction
+CONSTANTS = {'+': ADD_CONST, '-': SUB_CONST}
+
+
+class Code:
+    def __init__(self, code, consts, routines, globals_):
+        self.code = code
+        self.consts = consts
+        self.routines = routines
+        self.globals = globals_
+
+    def disassemble(self):
+        lines = []
+        pc = 0
+        while pc < len(self.code):
+            name, count = OPCODES[self.code[pc]]
+            operands = ' '.join(str(operand) for operand in self.code[pc + 1:pc + 1 + count])
+            lines.append('{:>5} {:<18} {}'.format(pc, name, operands).rstrip())
+            pc += 1 + count
+        return '\n'.join(lines)
+
+
+class Assembler(Visitor):
+    def __init__(self, ast):
+        super().__init__()
+        self.ast = ast
+        self.code = array('i')
+        self.consts = []
+        self.indexes = {}
+        self.routines = []
+        self.numbers = {}
+        self.loops = []
+        self.routine = None
+        self.template = None
+        self.starts = {}
+        self.last = None
+
+    # returns the position of the last operand, that is where a jump target gets patched
+    def emit(self, op, *operands):
+        self.last = len(self.code)
+        self.code.append(op)
+        self.code.extend(operands)
+        return len(self.code) - 1
+
+    def label(self):
+        return len(self.code)
+
+    def patch(self, at, target):
+        self.code[at] = target
+
+    def const(self, value):
+        key = (type(value), value)
+        if key not in self.indexes:
+            self.indexes[key] = len(self.consts)
+            self.consts.append(value)
+        return self.indexes[key]
+
+    def default(self, decl):
+        if isinstance(decl.type_, ShortString):
+            return ''
+        return DEFAULTS.get(decl.type_.value)
+
+    # depth 0 is the globals list, everything deeper lives in the frame of the running routine
+    def address(self, id_):
+        if self.routine is not None and id_.depth == 0 and id_.value == self.routine.id_.value:
+            return False, self.routine.block.size
+        return id_.depth == 0, id_.slot
+
+    def load(self, id_):
+        global_, slot = self.address(id_)
+        self.emit(LOAD_GLOBAL if global_ else LOAD_LOCAL, slot)
+
+    def store(self, id_):
+        global_, slot = self.address(id_)
+        self.emit(STORE_GLOBAL if global_ else STORE_LOCAL, slot)
+
+    # the start index goes with the slot, the vm checks an index against it and the end of the list
+    def load_elem(self, node):
+        self.visit(node, node.index)
+        global_, slot = self.address(node.id_)
+        self.emit(LOAD_ELEM_GLOBAL if global_ else LOAD_ELEM_LOCAL, slot, self.starts[global_, slot])
+
+    def store_elem(self, node):
+        self.visit(node, node.index)
+        global_, slot = self.address(node.id_)
+        self.emit(STORE_ELEM_GLOBAL if global_ else STORE_ELEM_LOCAL, slot, self.starts[global_, slot])
+
+    def binary(self, symbol):
+        code = self.code
+        if symbol in CONSTANTS and self.last == len(code) - 2 and code[self.last] == CONST:
+            code[self.last] = CONSTANTS[symbol]
+        else:
+            self.emit(BINARY, SYMBOLS.index(symbol))
+
+    # a comparison and the branch on its result are one instruction, returns where the target goes
+    def condition(self, node, cond):
+        if isinstance(cond, BinOp) and cond.symbol in COMPARISONS and not hasattr(cond, 'decimal'):
+            self.visit(cond, cond.first)
+            self.visit(cond, cond.second)
+            return self.emit(JUMP_UNLESS, SYMBOLS.index(cond.symbol), 0)
+        self.visit(node, cond)
+        return self.emit(JUMP_IF_FALSE, 0)
+
+    def declare(self, declarations):
+        for decl in declarations:
+            if isinstance(decl, ArrayDecl):
+                self.visit(None, decl)
+            else:
+                self.template[decl.id_.slot] = self.default(decl)
+
+    # the bound of a for loop gets a slot of its own past the declared ones
+    def hidden(self):
+        self.template.append(None)
+        return self.routine is None, len(self.template) - 1
+
+    def visit_Program(self, parent, node):
+        self.template = [None] * node.size
+        declarations = []
+        for n in node.nodes:
+            if isinstance(n, Func) or isinstance(n, Proc):
+                self.numbers[n.id_.value] = len(self.numbers)
+                self.routines.append(None)
+            elif isinstance(n, Var):
+                declarations.extend(n.nodes)
+        self.declare(declarations)
+        self.visit(node, node.nodes[-1])
+        self.emit(HALT)
+        globals_ = self.template
+        for n in node.nodes:
+            if isinstance(n, Func) or isinstance(n, Proc):
+                self.visit(node, n)
+        return globals_
+
+    def visit_Func(self, parent, node):
+        self.visit_routine(node)
+
+    def visit_Proc(self, parent, node):
+        self.visit_routine(node)
+
+    # a routine frame holds its parameters, its variables, its result and then the for bounds
+    def visit_routine(self, node):
+        entry = self.label()
+        self.routine = node
+        self.template = [None] * (node.block.size + 1)
+        if node.variables is not None:
+            self.declare(node.variables.nodes)
+        self.visit(node, node.block)
+        self.emit(RETURN, node.block.size)
+        count = 0 if node.params is None else len(node.params.params)
+        self.routines[self.numbers[node.id_.value]] = (entry, self.template, count)
+        self.routine = None
+
+    # arrays are indexed directly like in the closure compiler, the list runs up to the end index
+    def visit_ArrayDecl(self, parent, node):
+        values = () if node.elems is None else tuple(self.value(e) for e in node.elems.elems)
+        self.emit(NEW_ARRAY, self.const((node.end_index.value + 1, node.start_index.value,
+                                         DEFAULTS.get(node.type_.value), values)))
+        self.starts[self.address(node.id_)] = node.start_index.value
+        self.store(node.id_)
+
+    def visit_Block(self, parent, node):
+        for n in node.nodes:
+            if isinstance(n, FuncProcCall):
+                if self.visit(node, n):
+                    self.emit(POP)
+            else:
+                self.visit(node, n)
+
+    def visit_Assign(self, parent, node):
+        self.visit(node, node.expr)
+        if isinstance(node.id_, ArrayElem):
+            self.store_elem(node.id_)
+        else:
+            self.store(node.id_)
+
+    def visit_If(self, parent, node):
+        false = self.condition(node, node.cond)
+        self.visit(node, node.true)
+        if node.false is None:
+            self.patch(false, self.label())
+            return
+        end = self.emit(JUMP, 0)
+        self.patch(false, self.label())
+        self.visit(node, node.false)
+        self.patch(end, self.label())
+
+    # break and continue jump to addresses that are only known once the loop is emitted
+    def open_loop(self):
+        self.loops.append(([], []))
+
+    def close_loop(self, continue_, break_):
+        continues, breaks = self.loops.pop()
+        for at in continues:
+            self.patch(at, continue_)
+        for at in breaks:
+            self.patch(at, break_)
+
+    def visit_While(self, parent, node):
+        top = self.label()
+        exit_ = self.condition(node, node.cond)
+        self.open_loop()
+        self.visit(node, node.block)
+        self.emit(JUMP, top)
+        self.patch(exit_, self.label())
+        self.close_loop(top, self.label())
+
+    def visit_Repeat(self, parent, node):
+        top = self.label()
+        self.open_loop()
+        self.visit(node, node.block)
+        cond = self.label()
+        self.patch(self.condition(node, node.cond), top)
+        self.close_loop(cond, self.label())
+
+    # the bound is evaluated once into a hidden slot, the counter ends one step past it
+    def visit_For(self, parent, node):
+        counter = node.start.id_
+        increment = node.type_.value == 'increment'
+        self.visit(node, node.start)
+        self.visit(node, node.end)
+        global_, bound = self.hidden()
+        self.emit(STORE_GLOBAL if global_ else STORE_LOCAL, bound)
+        top = self.label()
+        self.load(counter)
+        self.emit(LOAD_GLOBAL if global_ else LOAD_LOCAL, bound)
+        exit_ = self.emit(JUMP_UNLESS, SYMBOLS.index('<=' if increment else '>='), 0)
+        body = self.label()
+        self.open_loop()
+        self.visit(node, node.block)
+        step = self.label()
+        # the step, the test and the jump back are one instruction when counter and bound share a frame
+        if self.address(counter)[0] == global_:
+            if global_:
+                op = FOR_NEXT_GLOBAL if increment else FOR_PREV_GLOBAL
+            else:
+                op = FOR_NEXT_LOCAL if increment else FOR_PREV_LOCAL
+            self.emit(op, self.address(counter)[1], bound, body)
+        else:
+            self.load(counter)
+            self.emit(ADD_CONST if increment else SUB_CONST, self.const(1))
+            self.store(counter)
+            self.emit(JUMP, top)
+        self.patch(exit_, self.label())
+        self.close_loop(step, self.label())
+
+    def visit_Break(self, parent, node):
+        self.loops[-1][1].append(self.emit(JUMP, 0))
+
+    def visit_Continue(self, parent, node):
+        self.loops[-1][0].append(self.emit(JUMP, 0))
+
+    def visit_Exit(self, parent, node):
+        if self.routine is None:
+            self.emit(HALT)
+            return
+        if node.return_ is not None:
+            self.visit(node, node.return_)
+            self.emit(STORE_LOCAL, self.routine.block.size)
+        self.emit(RETURN, self.routine.block.size)
+
+    # returns whether the call leaves a value on the stack
+    def visit_FuncProcCall(self, parent, node):
+        func = node.id_.value
+        args = node.args.args
+        if func == 'write' or func == 'writeln':
+            for arg in args:
+                self.visit(node, arg)
+                if hasattr(arg, 'decimal'):
+                    self.emit(WRITE_FORMAT, self.const('{:.' + str(arg.decimal.value) + 'f}'))
+                else:
+                    self.emit(WRITE)
+            if func == 'writeln':
+                self.emit(CONST, self.const('\n'))
+                self.emit(WRITE)
+            return False
+        elif func == 'read' or func == 'readln':
+            for arg in args:
+                id_ = arg.id_ if isinstance(arg, ArrayElem) else arg
+                self.emit(READ, self.const(id_.type_))
+                if isinstance(arg, ArrayElem):
+                    self.store_elem(arg)
+                else:
+                    self.store(arg)
+            return False
+        elif func == 'ord' or func == 'chr':
+            self.visit(node, args[0])
+            self.emit(ORD if func == 'ord' else CHR)
+            return True
+        elif func not in self.numbers:
+            self.die_func(func)
+        for arg in args:
+            self.visit(node, arg)
+        self.emit(CALL, self.numbers[func])
+        return True
+
+    def visit_ArrayElem(self, parent, node):
+        self.load_elem(node)
+
+    def visit_Id(self, parent, node):
+        self.load(node)
+
+    def value(self, node):
+        if isinstance(node, Real):
+            return float(node.value)
+        elif isinstance(node, Boolean):
+            return node.value == 'true'
+        return node.value
+
+    def visit_Int(self, parent, node):
+        self.emit(CONST, self.const(self.value(node)))
+
+    def visit_Real(self, parent, node):
+        self.emit(CONST, self.const(self.value(node)))
+
+    def visit_Char(self, parent, node):
+        self.emit(CONST, self.const(self.value(node)))
+
+    def visit_String(self, parent, node):
+        self.emit(CONST, self.const(self.value(node)))
+
+    def visit_Boolean(self, parent, node):
+        self.emit(CONST, self.const(self.value(node)))
+
+    def visit_BinOp(self, parent, node):
+        if node.symbol not in OPERATORS:
+            self.die_operator(node.symbol)
+        self.visit(node, node.first)
+        self.visit(node, node.second)
+        self.binary(node.symbol)
+
+    def visit_UnOp(self, parent, node):
+        self.visit(node, node.first)
+        self.emit(NEG if node.symbol == '-' else NOT)
+
+    def assemble(self):
+        globals_ = self.visit(None, self.ast)
+        return Code(self.code, self.consts, self.routines, globals_)
+
+    def die_func(self, func):
+        raise SystemExit("Unknown function: {}".format(func))
+
+    def die_operator(self, symbol):
+        raise SystemExit("Unknown operator: {}".format(symbol))
+
+
+class VM:
+    def __init__(self, code, max_depth=10000):
+        self.code = code
+        self.max_depth = max_depth
+        self.writer = Writer()
+        self.reader = Reader(flush=self.writer.flush)
+
+    def new_array(self, size, start, default, values):
+        elems = [default] * size
+        elems[start:start + len(values)] = values
+        return elems
+
+    def run(self):
+        try:
+            self.execute()
+        finally:
+            self.writer.flush()
+
+    # one loop over the instructions, the common opcodes are tested first
+    def execute(self):
+        code = self.code.code.tolist()
+        consts = self.code.consts
+        routines = self.code.routines
+        globals_ = list(self.code.globals)
+        frame = globals_
+        calls = []
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        functions = FUNCTIONS
+        write = self.writer.write
+        read = self.reader.read
+        max_depth = self.max_depth
+        pc = 0
+        while True:
+            op = code[pc]
+            if op == LOAD_LOCAL:
+                push(frame[code[pc + 1]])
+                pc += 2
+            elif op == LOAD_GLOBAL:
+                push(globals_[code[pc + 1]])
+                pc += 2
+            elif op == CONST:
+                push(consts[code[pc + 1]])
+                pc += 2
+            elif op == STORE_LOCAL:
+                frame[code[pc + 1]] = pop()
+                pc += 2
+            elif op == STORE_GLOBAL:
+                globals_[code[pc + 1]] = pop()
+                pc += 2
+            elif op == LOAD_ELEM_GLOBAL:
+                elems = globals_[code[pc + 1]]
+                index = stack[-1]
+                if index < code[pc + 2] or index >= len(elems):
+                    self.die_index(index)
+                stack[-1] = elems[index]
+                pc += 3
+            elif op == LOAD_ELEM_LOCAL:
+                elems = frame[code[pc + 1]]
+                index = stack[-1]
+                if index < code[pc + 2] or index >= len(elems):
+                    self.die_index(index)
+                stack[-1] = elems[index]
+                pc += 3
+            elif op == STORE_ELEM_GLOBAL:
+                elems = globals_[code[pc + 1]]
+                index = pop()
+                if index < code[pc + 2] or index >= len(elems):
+                    self.die_index(index)
+                elems[index] = pop()
+                pc += 3
+            elif op == STORE_ELEM_LOCAL:
+                elems = frame[code[pc + 1]]
+                index = pop()
+                if index < code[pc + 2] or index >= len(elems):
+                    self.die_index(index)
+                elems[index] = pop()
+                pc += 3
+            elif op == JUMP_IF_FALSE:
+                if pop():
+                    pc += 2
+                else:
+                    pc = code[pc + 1]
+            elif op == FOR_NEXT_GLOBAL:
+                counter = code[pc + 1]
+                value = globals_[counter] + 1
+                globals_[counter] = value
+                if value <= globals_[code[pc + 2]]:
+                    pc = code[pc + 3]
+                else:
+                    pc += 4
+            elif op == FOR_NEXT_LOCAL:
+                counter = code[pc + 1]
+                value = frame[counter] + 1
+                frame[counter] = value
+                if value <= frame[code[pc + 2]]:
+                    pc = code[pc + 3]
+                else:
+                    pc += 4
+            elif op == BINARY:
+                second = pop()
+                stack[-1] = functions[code[pc + 1]](stack[-1], second)
+                pc += 2
+            elif op == JUMP_UNLESS:
+                second = pop()
+                if functions[code[pc + 1]](pop(), second):
+                    pc += 3
+                else:
+                    pc = code[pc + 2]
+            elif op == ADD_CONST:
+                stack[-1] = stack[-1] + consts[code[pc + 1]]
+                pc += 2
+            elif op == SUB_CONST:
+                stack[-1] = stack[-1] - consts[code[pc + 1]]
+                pc += 2
+            elif op == JUMP:
+                pc = code[pc + 1]
+            elif op == CALL:
+                if len(calls) == max_depth:
+                    self.die_depth()
+                entry, template, count = routines[code[pc + 1]]
+                callee = template.copy()
+                if count:
+                    callee[:count] = stack[-count:]
+                    del stack[-count:]
+                calls.append((pc + 2, frame))
+                frame = callee
+                pc = entry
+            elif op == RETURN:
+                value = frame[code[pc + 1]]
+                pc, frame = calls.pop()
+                push(value)
+            elif op == NEG:
+                stack[-1] = -stack[-1]
+                pc += 1
+            elif op == NOT:
+                value = stack[-1]
+                stack[-1] = not value if isinstance(value, bool) else ~value
+                pc += 1
+            elif op == FOR_PREV_GLOBAL:
+                counter = code[pc + 1]
+                value = globals_[counter] - 1
+                globals_[counter] = value
+                if value >= globals_[code[pc + 2]]:
+                    pc = code[pc + 3]
+                else:
+                    pc += 4
+            elif op == FOR_PREV_LOCAL:
+                counter = code[pc + 1]
+                value = frame[counter] - 1
+                frame[counter] = value
+                if value >= frame[code[pc + 2]]:
+                    pc = code[pc + 3]
+                else:
+                    pc += 4
+            elif op == POP:
+                pop()
+                pc += 1
+            elif op == WRITE:
+                write(str(pop()))
+                pc += 1
+            elif op == WRITE_FORMAT:
+                write(consts[code[pc + 1]].format(pop()))
+                pc += 2
+            elif op == READ:
+                push(read(consts[code[pc + 1]]))
+                pc += 2
+            elif op == ORD:
+                stack[-1] = ord(stack[-1])
+                pc += 1
+            elif op == CHR:
+                stack[-1] = chr(stack[-1])
+                pc += 1
+            elif op == NEW_ARRAY:
+                push(self.new_array(*consts[code[pc + 1]]))
+                pc += 2
+            elif op == HALT:
+                return
+            else:
+                raise SystemExit("Unknown opcode: {}".format(op))
+
+    def die_index(self, index):
+        raise SystemExit("Index out of range: {}".format(index))
+
+    def die_depth(self):
+        raise SystemExit("Stack overflow: call depth exceeds {}".format(self.max_depth))
@@ -0,0 +1,28 @@
+import sys
+
+POLICIES = ('line', 'block')
+
+
+class Writer:
+    def __init__(self, stream=None, policy='block', size=1 << 16):
+        self.stream = stream
+        self.policy = policy
+        self.size = size
+        self.parts = []
+        self.length = 0
+
+    # line flushes on every newline for interactive use, block only once the buffer is full
+    def write(self, text):
+        self.parts.append(text)
+        self.length += len(text)
+        if self.length >= self.size or self.policy == 'line' and '\n' in text:
+            self.flush()
+
+    def flush(self):
+        if len(self.parts) == 0:
+            return
+        stream = sys.stdout if self.stream is None else self.stream
+        stream.write(''.join(self.parts))
+        stream.flush()
+        self.parts = []
+        self.length = 0
@@ -1930,22 +1930,111 @@ class Runner(Visitor):
 
 
 
+import hashlib
+import os
+import pickle
+
+# the compiler version is the content of its sources, any edit invalidates every entry
+SOURCES = [os.path.abspath(__file__)]
+
+
+def version(sources):
+    digest = hashlib.sha256()
+    for path in sources:
+        with open(path, 'rb') as source:
+            digest.update(source.read())
+    return digest.hexdigest()
+
+
+class Cache:
+    def __init__(self, directory='.cache', limit=64 * 1024 * 1024, sources=SOURCES):
+        self.directory = directory
+        self.limit = limit
+        self.version = version(sources)
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, text, kind):
+        key = hashlib.sha256('{}\0{}\0{}'.format(self.version, kind, text).encode()).hexdigest()
+        return os.path.join(self.directory, '{}.pickle'.format(key))
+
+    # a hit touches the entry, eviction goes by modification time
+    def load(self, text, kind='ast'):
+        path = self.path(text, kind)
+        try:
+            with open(path, 'rb') as entry:
+                value = pickle.load(entry)
+            os.utime(path)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def store(self, text, value, kind='ast'):
+        path = self.path(text, kind)
+        temp = '{}.{}'.format(path, os.getpid())
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temp, 'wb') as entry:
+                pickle.dump(value, entry, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp, path)
+        except (OSError, RecursionError, pickle.PicklingError):
+            if os.path.exists(temp):
+                os.remove(temp)
+            return False
+        self.evict()
+        return True
+
+    def entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.pickle'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.limit:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
 import argparse
 
 arg_parser = argparse.ArgumentParser()
 arg_parser.add_argument('src')  # Izvorna PAS datoteka
 arg_parser.add_argument('gen')  # Generisana C datoteka
+arg_parser.add_argument('--no-cache', action='store_true')
 args = vars(arg_parser.parse_args())
 
 with open(args['src'], 'r') as source:
     text = source.read()
+
+cache = None if args['no_cache'] else Cache()
+ast = None if cache is None else cache.load(text)
+if ast is None:
     lexer = Lexer(text)
     tokens = lexer.lex()
     parser = Parser(tokens)
     ast = parser.parse()
     symbolizer = Symbolizer(ast)
     symbolizer.symbolize()
-    generator = Generator(ast)
-    generator.generate(args['gen'])
-    runner = Runner(ast)
-    runner.run()
\ No newline at end of file
+    if cache is not None:
+        cache.store(text, ast)
+generator = Generator(ast)
+generator.generate(args['gen'])
+runner = Runner(ast)
+runner.run()